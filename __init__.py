@@ -8,7 +8,6 @@ __license__   = 'GPL v3'
 __copyright__ = '2024 seeder'
 __docformat__ = 'restructuredtext en'
 
-import time
 try:
     from urllib.parse import quote
 except ImportError:
@@ -18,6 +17,7 @@ try:
     from queue import Empty, Queue
 except ImportError:
     from Queue import Empty, Queue
+from threading import Event
 
 from calibre.ebooks.metadata import check_isbn
 
@@ -26,7 +26,7 @@ try:
 except NameError:
     pass # load_translations() added in calibre 1.9
 
-from .shared.utils import load_url, strip_accents
+from .shared.utils import load_url, strip_accents_cached
 from .shared.prefs import PluginPrefsName
 from .shared.source import Source
 
@@ -128,6 +128,37 @@ class Legie(Source):
             url = self.cached_identifier_to_cover_url(legie_id)
             return url
 
+    # Caches are persisted on disk, so cover downloads and following jobs
+    # (running in other calibre processes) can use them
+    def cache_identifier_to_cover_url(self, id_, url):
+        Source.cache_identifier_to_cover_url(self, id_, url)
+        from .cache import get_cache, COVER_URLS
+        get_cache().set(COVER_URLS, id_, url)
+
+    def cached_identifier_to_cover_url(self, id_):
+        url = Source.cached_identifier_to_cover_url(self, id_)
+        if url is None and id_ is not None:
+            from .cache import get_cache, COVER_URLS
+            url = get_cache().get(COVER_URLS, id_)
+            if url is not None:
+                Source.cache_identifier_to_cover_url(self, id_, url)
+        return url
+
+    def cache_isbn_to_identifier(self, isbn, identifier):
+        Source.cache_isbn_to_identifier(self, isbn, identifier)
+        if isbn:
+            from .cache import get_cache, ISBN_TO_ID
+            get_cache().set(ISBN_TO_ID, isbn, identifier)
+
+    def cached_isbn_to_identifier(self, isbn):
+        identifier = Source.cached_isbn_to_identifier(self, isbn)
+        if identifier is None and isbn:
+            from .cache import get_cache, ISBN_TO_ID
+            identifier = get_cache().get(ISBN_TO_ID, isbn)
+            if identifier is not None:
+                Source.cache_isbn_to_identifier(self, isbn, identifier)
+        return identifier
+
     def get_pref(self, pref=None):
         """
         Returns MetadataPlugin specific preferences
@@ -140,10 +171,12 @@ class Legie(Source):
 
     def identify_results_keygen(self, title=None, authors=None,
             identifiers={}):
-        from .shared.compare import MetadataCompareKeyGen
+        from .shared.compare import MetadataCompareKeyGen, MetadataCompareContext
+        # query side is computed only once for all compared results
+        context = MetadataCompareContext(self, title, authors, identifiers)
         def keygen(mi):
             return MetadataCompareKeyGen(mi, self, title, authors,
-                identifiers)
+                identifiers, context=context)
         return keygen
 
     def create_query(self, log, title=None, authors=None, tales=False, search_engine='legie'):
@@ -184,27 +217,81 @@ class Legie(Source):
         Note this method will retry without identifiers automatically if no
         match is found with identifiers.
         '''
-        # search for identifiers and extra metadata in title field format identifier:123456; e.g. legie:1234, pubdate:2023
-        title, identifiers = self.search_title_for_metadata(title, identifiers)
-        self.identifiers = identifiers
-        log.info('Title:\t', title, '\nAuthors:\t', authors, '\nIds:\t', identifiers)
-        log.info('--------')
-        legie_id = identifiers.get('legie', None)
-        legie_povidka_id = identifiers.get('legie_povidka', None)
-        isbn = check_isbn(identifiers.get('isbn', None))
-        ean = check_isbn(identifiers.get('ean', None))
-
-        # get plugin preferences
-        max_results = self.get_pref(PluginPrefsName.KEY_MAX_DOWNLOADS)
-        legie_id_search = self.get_pref(PluginPrefsName.IDENTIFIER_SEARCH)
-        isbn_search = self.get_pref(PluginPrefsName.ISBN_SEARCH)
-        tales_search = self.get_pref(PluginPrefsName.TALES_SEARCH) or self.identifiers.get('type', None) == 'p'
-        google_engine = self.get_pref(PluginPrefsName.GOOGLE_SEARCH) or self.identifiers.get('search', None) == 'g'
-        duckduckgo_engine = self.get_pref(PluginPrefsName.DUCKDUCKGO_SEARCH) or self.identifiers.get('search', None) == 'd'
+        # single book run of bulk identify (metadata in title field, e.g. legie:1234, pubdate:2023, are parsed there)
+        from .bulk import SingleBookQueue
+        self.identify_bulk(log, [(title, authors, identifiers)], SingleBookQueue(result_queue), abort,
+                           timeout=timeout, resume=False)
+        return None
 
-        # add google search cookies
+    def identify_bulk(self, log, books, result_queue, abort, timeout=30, resume=True):
+        '''
+        Identifies more books in one run, books is list of (title, authors, identifiers)
+        or (title, authors, identifiers, series index).
+        Searches and workers of all books run on one bounded scheduler and share
+        downloaded pages, so same queries and book pages are downloaded only once.
+        Results are streamed into result_queue as (book index, Metadata),
+        (book index, None) is put once the book is finished.
+        With resume, progress and downloaded pages are kept in job journal - interrupted
+        run started again with the same books repeats no finished requests, results of
+        already emitted books are built again from pages stored in journal.
+        Books matching volume (title, author, series index) of series already found in this run
+        are resolved from series page without searching.
+        '''
+        # get plugin preferences (one snapshot shared with workers for whole run)
+        from .prefs import get_snapshot, LegiePrefsName
+        from .pool import TaskScheduler
+        from .bulk import SharedBrowser, BookQueue
+        prefs = get_snapshot()
+        # metadata in title fields (e.g. legie:1234), passed identifiers are updated as in identify
+        books = [self.search_title_for_metadata(book[0], book[2] if book[2] is not None else {}) +
+                 (book[1], book[3] if len(book) > 3 else None) for book in books]
+        google_engine = prefs.get(PluginPrefsName.GOOGLE_SEARCH) or \
+            any(identifiers.get('search', None) == 'g' for title, identifiers, authors, series_index in books)
+        br = self.prepare_browser(google_engine)
+        journal, states = None, {}
+        if resume:
+            from .journal import open_journal, JournalBrowser
+            try:
+                journal = open_journal([(title, authors, identifiers) for title, identifiers, authors, series_index in books])
+                states = journal.states()
+                br = JournalBrowser(br, journal)
+            except:
+                log.exception('*** Job journal not available, running without resume')
+                journal = None
+        br = SharedBrowser(br)
+
+        from .journal import SEARCHED, FETCHED, EMITTED
+        from .series import SeriesResolver
+        # sibling volumes only help when more books are identified
+        series = SeriesResolver(self.BASE_URL) if len(books) > 1 else None
+        scheduler = TaskScheduler(log, abort, prefs.get(LegiePrefsName.MAX_WORKERS))
+        resumed = 0
+        for index, (title, identifiers, authors, series_index) in enumerate(books):
+            queue = BookQueue(result_queue, index, journal)
+            state, candidates = states.get(index, (None, None))
+            if state == EMITTED:
+                # finished by interrupted run, its results are built again
+                # from book pages stored in journal (no requests)
+                resumed += 1
+            # searches run after workers of already searched books (results are streamed early),
+            # series volumes are matched when search starts - only books whose search waits for
+            # a free slot (beyond MAX_WORKERS parallel searches) can skip it
+            scheduler.submit((1, index), self.identify_book, log, scheduler, br, prefs, queue, abort,
+                             title, authors, identifiers, timeout,
+                             candidates if state in (SEARCHED, FETCHED, EMITTED) else None, series, series_index)
+        if resumed:
+            log.info('Resuming job, %s of %s books already finished (emitted again from journal)'%(resumed, len(books)))
+        scheduler.run()
+        log.info('Bulk identify of %s books: %s requests, %s shared'%(len(books), br.requests, br.hits))
+        if journal is not None and not abort.is_set():
+            states = journal.states()
+            if len(states) == len(books) and all(s[0] == EMITTED for s in states.values()):
+                journal.finish()
+
+    def prepare_browser(self, google_engine):
         br = self.browser
         br.set_header('user-agent', 'Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:47.0) Gecko/20100101 Firefox/47.0')
+        # add google search cookies
         if google_engine:
             br.set_simple_cookie('CONSENT', 'PENDING+987', '.google.com', path='/')
             template = b'\x08\x01\x128\x08\x14\x12+boq_identityfrontenduiserver_20231107.05_p0\x1a\x05en-US \x03\x1a\x06\x08\x80\xf1\xca\xaa\x06'
@@ -212,18 +299,103 @@ class Legie(Source):
             from base64 import standard_b64encode
             template.replace(b'20231107', date.today().strftime('%Y%m%d').encode('ascii'))
             br.set_simple_cookie('SOCS', standard_b64encode(template).decode('ascii').rstrip('='), '.google.com', path='/')
+        return br
+
+    def identify_book(self, log, scheduler, br, prefs, queue, abort, title, authors, identifiers, timeout=30,
+                      candidates=None, series=None, series_index=None):
+        '''
+        Search cascade of one book in bulk identify, found book pages are scheduled as workers.
+        Candidates found by interrupted run or volume of already found series are used without searching.
+        '''
+        try:
+            self._identify_book(log, scheduler, br, prefs, queue, abort, title, authors, identifiers, timeout,
+                                candidates, series, series_index)
+        except:
+            log.exception('*** Identify failed for title: %s'%title)
+            queue.done(finished=False)
+
+    def _identify_book(self, log, scheduler, br, prefs, queue, abort, title, authors, identifiers, timeout,
+                       candidates, series, series_index):
+        log.info('Title:\t', title, '\nAuthors:\t', authors, '\nIds:\t', identifiers)
+        log.info('--------')
+        series_url = None
+        if candidates is None and series is not None and title and \
+                not (identifiers.get('legie', None) or identifiers.get('legie_povidka', None)) and \
+                identifiers.get('type', None) != 'p':
+            series_url = series.match(title, authors, series_index)
+        if candidates is not None:
+            log.info('Using candidates found by interrupted run: %s'%candidates)
+            matches, documents = candidates, {}
+        elif series_url is not None:
+            log.info('Book found in already resolved series: %s'%series_url)
+            matches, documents = [series_url], {}
+        else:
+            try:
+                matches, documents = self.search_matches(log, br, prefs, title, authors, identifiers, timeout)
+            except:
+                log.exception('*** Search failed for title: %s'%title)
+                queue.done(finished=False)
+                return
+
+        if abort.is_set():
+            log.info("Abort is set to true, aborting")
+            queue.done(finished=False)
+            return
+        queue.searched(matches)
+
+        if not matches:
+            log.error('No matches found. Try to fill Title field.')
+            queue.done()
+            return
+
+        from calibre_plugins.legie.worker import Worker
+        from .prefs import LegiePrefsName
+        from .pool import ConfidenceQueue, run_worker
+        from .shared.compare import match_confidence
+        # stop remaining workers once a high confidence match is found
+        cancel = Event()
+        threshold = prefs.get(LegiePrefsName.CONFIDENCE_THRESHOLD)
+        result_queue = queue
+        if threshold:
+            result_queue = ConfidenceQueue(queue, lambda mi: match_confidence(mi, title, authors, identifiers),
+                                           threshold, cancel, log)
+        workers = [Worker(url, result_queue, br, log, i, self, prefs=prefs, cancel=cancel,
+                          document=documents.get(url, None), identifiers=identifiers, series=series)
+                   for i, url in enumerate(matches)]
+        queue.add_workers(len(workers))
+        for worker in workers:
+            # workers of book started in relevance order
+            scheduler.submit((0, queue.index, worker.relevance), run_worker, worker, queue.worker_finished)
+
+    def search_matches(self, log, br, prefs, title, authors, identifiers, timeout=30):
+        '''
+        Returns (matches, documents) - found book urls and already downloaded book pages (exact matches)
+        '''
+        legie_id = identifiers.get('legie', None)
+        legie_povidka_id = identifiers.get('legie_povidka', None)
+        isbn = check_isbn(identifiers.get('isbn', None))
+        ean = check_isbn(identifiers.get('ean', None))
+
+        max_results = prefs.get(PluginPrefsName.KEY_MAX_DOWNLOADS)
+        legie_id_search = prefs.get(PluginPrefsName.IDENTIFIER_SEARCH)
+        isbn_search = prefs.get(PluginPrefsName.ISBN_SEARCH)
+        tales_search = prefs.get(PluginPrefsName.TALES_SEARCH) or identifiers.get('type', None) == 'p'
+        google_engine = prefs.get(PluginPrefsName.GOOGLE_SEARCH) or identifiers.get('search', None) == 'g'
+        duckduckgo_engine = prefs.get(PluginPrefsName.DUCKDUCKGO_SEARCH) or identifiers.get('search', None) == 'd'
 
-        br = self.browser
         query = None
         matches = []
         no_matches = []
+        # already downloaded book pages (exact matches), handed to workers to avoid second request
+        documents = {}
         # search via legie identifier
         exact_match = False
         if legie_id and legie_id_search:
-            _, response = load_url(log, ''.join([self.BASE_URL, '/kniha/', legie_id]), br)
+            root, response = load_url(log, ''.join([self.BASE_URL, '/kniha/', legie_id]), br)
             try:
                 if response.geturl().find(legie_id) != -1:
                     matches.append(response.geturl())
+                    documents[response.geturl()] = root
                     exact_match = True
                 else:
                     log.error('Wrong legie identifier was inserted.\nContinuing with ISBN or Title/Author(s) search.')
@@ -235,6 +407,7 @@ class Legie(Source):
             root, response = load_url(log, ''.join([self.BASE_URL, '/index.php?search_ignorovat_casopisy=on&omezeni=ksp&search_isbn=', isbn]), br)
             if response.geturl().find(isbn) == -1 and response.geturl().find('/kniha/'):
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 exact_match = True
             else:
                 # when more than one result return from isbn search
@@ -244,6 +417,7 @@ class Legie(Source):
             root, response = load_url(log, ''.join([self.BASE_URL, '/index.php?search_ignorovat_casopisy=on&omezeni=ksp&search_vydani_poznamka=', isbn]), br)
             if response.geturl().find(isbn) == -1 and response.geturl().find('/kniha/'):
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 exact_match = True
             else:
                 # when more than one result return from isbn search
@@ -254,6 +428,7 @@ class Legie(Source):
             root, response = load_url(log, ''.join([self.BASE_URL, '/index.php?search_ignorovat_casopisy=on&omezeni=ksp&search_isbn=', ean]), br)
             if response.geturl().find(ean) == -1 and response.geturl().find('/kniha/'):
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 exact_match = True
             else:
                 # when more than one result return from ean search
@@ -263,6 +438,7 @@ class Legie(Source):
             root, response = load_url(log, ''.join([self.BASE_URL, '/index.php?search_ignorovat_casopisy=on&omezeni=ksp&search_vydani_poznamka=', ean]), br)
             if response.geturl().find(ean) == -1 and response.geturl().find('/kniha/'):
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 exact_match = True
             else:
                 # when more than one result return from isbn search
@@ -271,10 +447,11 @@ class Legie(Source):
         ## TALES searching
         # search via legie_povidka identifier
         if legie_povidka_id and legie_id_search:
-            _, response = load_url(log, ''.join([self.BASE_URL, '/povidka/', legie_povidka_id]), br)
+            root, response = load_url(log, ''.join([self.BASE_URL, '/povidka/', legie_povidka_id]), br)
             try:
                 if response.geturl().find(legie_povidka_id) != -1:
                     matches.append(response.geturl())
+                    documents[response.geturl()] = root
                     exact_match = True
                 else:
                     log.error('Wrong legie_povidka identifier was inserted.\nContinuing with ISBN or Title/Author(s) search.')
@@ -308,6 +485,7 @@ class Legie(Source):
             root, response = load_url(log, query, br)
             if response.geturl().find( 'index.php?') == -1:
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 log.info('ID in query, redirected right to book page...')
                 exact_match = True
             else:
@@ -323,6 +501,7 @@ class Legie(Source):
             root, response = load_url(log, query, br)
             if response.geturl().find( 'index.php?') == -1:
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 log.info('ISBN in query, redirected right to book page...')
                 exact_match = True
             else:
@@ -342,6 +521,7 @@ class Legie(Source):
                     root, response = load_url(log, query, br)
                     if response.geturl().find( 'index.php?') == -1:
                         matches.append(response.geturl())
+                        documents[response.geturl()] = root
                         log.info('ISBN in query, redirected right to book page...')
                         exact_match = True
                     else:
@@ -376,6 +556,7 @@ class Legie(Source):
             root, response = load_url(log, query, br)
             if response.geturl().find( 'index.php?') == -1:
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 log.info('ISBN in query, redirected right to book page...')
                 exact_match = True
             else:
@@ -387,6 +568,7 @@ class Legie(Source):
             root, response = load_url(log, query, br)
             if response.geturl().find( 'index.php?') == -1:
                 matches.append(response.geturl())
+                documents[response.geturl()] = root
                 log.info('ISBN in query, redirected right to book page...')
                 exact_match = True
             else:
@@ -403,6 +585,7 @@ class Legie(Source):
                     root, response = load_url(log, query, br)
                     if response.geturl().find( 'index.php?') == -1:
                         matches.append(response.geturl())
+                        documents[response.geturl()] = root
                         log.info('ISBN in query, redirected right to book page...')
                         exact_match = True
                     else:
@@ -448,36 +631,7 @@ class Legie(Source):
                     matches.append(nmatch)
         log.info('Matches: %s'%(matches))
 
-        if abort.is_set():
-            log.info("Abort is set to true, aborting")
-            return
-
-        if not matches:
-            log.error('No matches found. Try to fill Title field.')
-            return
-
-
-        from calibre_plugins.legie.worker import Worker
-        workers = [Worker(url, result_queue, self.browser, log, i, self) for i, url in
-                   enumerate(matches)]
-
-        for w in workers:
-            w.start()
-            # Don't send all requests at the same time
-            time.sleep(0.1)
-
-        while not abort.is_set():
-            a_worker_is_alive = False
-            for w in workers:
-                w.join(0.2)
-                if abort.is_set():
-                    break
-                if w.is_alive():
-                    a_worker_is_alive = True
-            if not a_worker_is_alive:
-                break
-
-        return None
+        return matches, documents
 
     def _parse_search_results(self, log, orig_title, orig_authors, root, matches, no_matches, timeout, tales=False):
         max_results = self.get_pref(PluginPrefsName.KEY_MAX_DOWNLOADS)
@@ -512,7 +666,7 @@ class Legie(Source):
 
             vlozit = False
             #compare title match (without accents)
-            if orig_title and title and strip_accents(orig_title).lower() == strip_accents(title).lower():
+            if orig_title and title and strip_accents_cached(orig_title).lower() == strip_accents_cached(title).lower():
                 vlozit = True
 
 
@@ -528,6 +682,207 @@ class Legie(Source):
 
         log.info('Matches: %s .. No matches: %s'%(matches, no_matches))
 
+    def resolve_cover_urls(self, log, identifiers, timeout=30):
+        '''
+        Finds cover urls without running identify - downloads only issues page (/kniha/<id>/vydani)
+        of book given by legie identifier (or identifier cached for ISBN) and picks preferred issue
+        '''
+        legie_id = identifiers.get('legie', None)
+        if legie_id is None:
+            isbn = check_isbn(identifiers.get('isbn', None))
+            if isbn is not None:
+                legie_id = self.cached_isbn_to_identifier(isbn)
+        if legie_id is None:
+            return None
+
+        from calibre_plugins.legie.worker import Worker, book_stub
+        from .prefs import get_snapshot
+        prefs = get_snapshot()
+        max_covers = prefs.get(PluginPrefsName.MAX_COVERS)
+        book_id, _, pubyear = legie_id.partition('#')
+        url = ''.join([self.BASE_URL, '/kniha/', book_id])
+        # issue selection uses identifiers same way as in identify
+        wanted = dict(identifiers)
+        if pubyear:
+            wanted['pubdate'] = pubyear
+
+        worker = Worker(url, Queue(), self.browser, log, 0, self, timeout=timeout, prefs=prefs, identifiers=wanted)
+        try:
+            root, _ = load_url(log, '%s%s'%(url, '/vydani'), worker.browser, timeout=timeout)
+            # same issue selection as in Worker.get_details
+            unique_list, issue, duplicates = worker.select_issues(root, book_stub(book_id))
+        except:
+            log.exception('*** Failed to resolve cover for legie id: %s'%legie_id)
+            return None
+        if issue is None:
+            if not unique_list:
+                return None
+            issue, duplicates = unique_list[0], []
+
+        cover_urls = []
+        if max_covers > 1:
+            # covers of selected issue first, then of its duplicate issues
+            for i in [issue] + [d for d in duplicates if d is not issue]:
+                for cover_url in i.cover_urls or ([i.cover_url] if i.cover_url else []):
+                    if cover_url not in cover_urls:
+                        cover_urls.append(cover_url)
+        elif issue.cover_url:
+            cover_urls = [issue.cover_url]
+
+        if prefs.get(PluginPrefsName.OBALKYKNIH_COVER):
+            obalky_cover_url = worker.get_obalkyknih_cover([issue.mi_isbn, issue.ean])
+            if obalky_cover_url:
+                cover_urls.append(obalky_cover_url)
+
+        if not cover_urls:
+            return None
+        log.info('Resolved covers for legie id %s: %s'%(legie_id, cover_urls))
+        self.cache_identifier_to_cover_url(legie_id, cover_urls)
+        return cover_urls
+
+    def refresh(self, log, books, result_queue, abort, timeout=30):
+        '''
+        Incremental refresh of books with legie identifier, books is list of identifiers.
+        Book page and its subpages (issues, awards, tales) are requested conditionally
+        (ETag, Last-Modified) and fingerprinted, metadata are parsed and put
+        into result_queue as (book index, Metadata) only for books whose pages (or plugin
+        preferences) changed since the last refresh. (book index, None) is put once the book
+        is finished. Returns counts of unchanged, changed and failed books.
+        '''
+        from .prefs import get_snapshot, LegiePrefsName
+        from .pool import TaskScheduler
+        from .bulk import SharedBrowser, BookQueue
+        from .refresh import RefreshStats
+        prefs = get_snapshot()
+        br = SharedBrowser(self.prepare_browser(False))
+        stats = RefreshStats()
+        scheduler = TaskScheduler(log, abort, prefs.get(LegiePrefsName.MAX_WORKERS))
+        for index, identifiers in enumerate(books):
+            scheduler.submit(index, self.refresh_book, log, br, prefs, stats,
+                             BookQueue(result_queue, index), dict(identifiers), timeout)
+        scheduler.run()
+        log.info('Refresh of %s books - %s'%(len(books), stats))
+        return stats.as_dict()
+
+    def refresh_book(self, log, br, prefs, stats, queue, identifiers, timeout=30):
+        try:
+            state = self._refresh_book(log, br, prefs, queue, identifiers, timeout)
+        except:
+            log.exception('*** Refresh failed for identifiers: %s'%identifiers)
+            state = 'failed'
+        stats.add(state)
+        queue.done()
+
+    def _refresh_book(self, log, br, prefs, queue, identifiers, timeout):
+        legie_id = identifiers.get('legie', None) or identifiers.get('legie_povidka', None)
+        if not legie_id:
+            log.error('No legie identifier, book can not be refreshed: %s'%identifiers)
+            return 'failed'
+        book_id, _, pubyear = legie_id.partition('#')
+        if pubyear and not identifiers.get('pubdate', None):
+            identifiers['pubdate'] = pubyear
+        url = ''.join([self.BASE_URL, '/kniha/' if identifiers.get('legie', None) else '/povidka/', book_id])
+
+        from .refresh import page_fingerprint, subpages, subpage_xpath, header, PAGE_FINGERPRINT_XPATH
+        from .cache import get_cache, FINGERPRINTS
+        cache = get_cache()
+        stored = cache.get(FINGERPRINTS, legie_id) or {}
+        old_pages = stored.get('pages', {})
+
+        def check_page(page_url, xpath):
+            # conditional request, not modified page keeps its stored fingerprint
+            old = old_pages.get(page_url, {})
+            response = br.open_conditional(page_url, old.get('etag', None), old.get('last_modified', None), timeout=timeout)
+            if response is None:
+                log.info('Page not modified: %s'%page_url)
+                return old, None
+            # parsed from response shared by browser (no other request)
+            page_root, _ = load_url(log, page_url, br, timeout=timeout)
+            return {'hash': page_fingerprint(page_root, xpath), 'etag': header(response.info(), 'ETag'),
+                    'last_modified': header(response.info(), 'Last-Modified')}, page_root
+
+        # book page and its subpages read by Worker (issues, awards, tales)
+        pages = {}
+        pages[url], root = check_page(url, PAGE_FINGERPRINT_XPATH)
+        if root is not None:
+            sub = subpages(url, root)
+        else:
+            sub = [(u, subpage_xpath(u)) for u in old_pages if u != url]
+        for page_url, xpath in sub:
+            pages[page_url], _ = check_page(page_url, xpath)
+        fingerprint = {'prefs': prefs.fingerprint(), 'pages': pages}
+        if stored.get('prefs', None) == fingerprint['prefs'] and \
+                dict((u, p.get('hash', None)) for u, p in old_pages.items()) == dict((u, p.get('hash', None)) for u, p in pages.items()):
+            log.info('Book not changed since last refresh: %s'%url)
+            if stored != fingerprint:
+                # new validators of the same content
+                cache.set(FINGERPRINTS, legie_id, fingerprint)
+            return 'unchanged'
+        if root is None:
+            root, _ = load_url(log, url, br, timeout=timeout)
+
+        from calibre_plugins.legie.worker import Worker
+        from .pool import run_worker
+        results = Queue()
+        run_worker(Worker(url, results, br, log, 0, self, timeout=timeout, prefs=prefs,
+                          document=root, identifiers=identifiers))
+        found = []
+        while True:
+            try:
+                found.append(results.get_nowait())
+            except Empty:
+                break
+        if not found:
+            return 'failed'
+        for mi in found:
+            queue.put(mi)
+        cache.set(FINGERPRINTS, legie_id, fingerprint)
+        return 'changed'
+
+    def refresh_ratings(self, log, books, result_queue, abort, timeout=30):
+        '''
+        Ratings refresh of books with legie identifier, books is list of identifiers.
+        Only book page is downloaded, minimal metadata with rating (and rating identifiers)
+        are put into result_queue as (book index, Metadata), other metadata are not changed.
+        Nothing is put for books without rating. (book index, None) is put once the book is finished.
+        '''
+        from .prefs import get_snapshot, LegiePrefsName
+        from .pool import TaskScheduler
+        from .bulk import SharedBrowser, BookQueue
+        prefs = get_snapshot()
+        # given legie ids are always used (identifier search preference applies to search cascade only)
+        br = SharedBrowser(self.prepare_browser(False))
+        scheduler = TaskScheduler(log, abort, prefs.get(LegiePrefsName.MAX_WORKERS))
+        for index, identifiers in enumerate(books):
+            scheduler.submit(index, self.refresh_rating, log, br, prefs,
+                             BookQueue(result_queue, index), dict(identifiers), timeout)
+        scheduler.run()
+        log.info('Ratings refresh of %s books: %s requests'%(len(books), br.requests))
+
+    def refresh_rating(self, log, br, prefs, queue, identifiers, timeout=30):
+        from calibre_plugins.legie.worker import Worker
+        try:
+            if identifiers.get('legie', None):
+                book_id, url = identifiers['legie'], ''.join([self.BASE_URL, '/kniha/', identifiers['legie'].partition('#')[0]])
+            elif identifiers.get('legie_povidka', None):
+                book_id, url = identifiers['legie_povidka'], ''.join([self.BASE_URL, '/povidka/', identifiers['legie_povidka']])
+            else:
+                log.error('No legie identifier, rating can not be refreshed: %s'%identifiers)
+                queue.done()
+                return
+            root, _ = load_url(log, url, br, timeout=timeout)
+            worker = Worker(url, queue, br, log, 0, self, timeout=timeout, prefs=prefs, identifiers=identifiers)
+            mi = worker.get_rating_details(root, None, None, book_id)
+        except:
+            log.exception('*** Failed to download rating for identifiers: %s'%identifiers)
+            queue.done()
+            return
+        if mi is None:
+            log.info('No rating found: %s'%url)
+        else:
+            queue.put(mi)
+        queue.done()
+
     def download_cover(self, log, result_queue, abort,
             title=None, authors=None, identifiers={}, timeout=30, get_best_cover=False):
         max_covers = self.get_pref(PluginPrefsName.MAX_COVERS)
@@ -539,6 +894,10 @@ class Legie(Source):
         br = self.browser
         cached_url = self.get_cached_cover_url(identifiers)
 
+        # cover only resolving from issues page when legie id is known
+        if cached_url is None:
+            cached_url = self.resolve_cover_urls(log, identifiers, timeout)
+
         # none img_urls .. searching for some with identify
         if cached_url is None:
             log.info('No cached cover found, running identify')
@@ -552,32 +911,23 @@ class Legie(Source):
                     results.append(rq.get_nowait())
                 except Empty:
                     break
-            results.sort(key=self.identify_results_keygen(title=title, authors=authors, identifiers=identifiers))
+            from .shared.compare import MetadataCompareContext, sort_candidates
+            results = sort_candidates(results, self, MetadataCompareContext(self, title, authors, identifiers))
             for mi in results:
                 cached_url = self.get_cached_cover_url(mi.identifiers)
                 if cached_url is not None:
                     break
 
         if cached_url is not None:
-            # one img_url
-            if len(cached_url) == 1:
-                try:
-                    cdata = br.open_novisit(cached_url[0], timeout=timeout).read()
-                    result_queue.put((self, cdata))
-                except:
-                    log.exception('*** Failed to download cover - %s' % cached_url[0])
-            # multiple img_urls
-            elif len(cached_url) > 1:
-                if obalky_cover:
-                    checked_urls = cached_url[:max_covers+1]
-                else:
-                    checked_urls = cached_url[:max_covers]
-                for url in checked_urls:
-                    try:
-                        cdata = br.open_novisit(url, timeout=timeout).read()
-                        result_queue.put((self, cdata))
-                    except:
-                        log.exception('*** Failed to download cover - %s' % url)
+            if len(cached_url) > 1:
+                # obalkyknih cover does not count into max covers limit
+                cached_url = cached_url[:max_covers+1] if obalky_cover else cached_url[:max_covers]
+            from .covers import download_covers
+            from .prefs import LegiePrefsName
+            for cdata in download_covers(log, br, cached_url, timeout,
+                                         self.get_pref(LegiePrefsName.MAX_WORKERS), abort,
+                                         get_best_cover=get_best_cover):
+                result_queue.put((self, cdata))
 
         if cached_url is None:
             log.info('No cover found')
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+from .shared.prefs import PluginPrefsName, MetadataIdentifier
+
+# Renderers for comments - (mi, is_tale) -> html paragraph string
+COMMENT_RENDERERS = {
+    MetadataIdentifier.DESCRIPTION: lambda mi, is_tale: mi.mi_comments if mi.mi_comments else '',
+    MetadataIdentifier.HR: lambda mi, is_tale: '<hr>',
+    MetadataIdentifier.PAGES: lambda mi, is_tale: '<p id="numberOfPages"><em>Počet stran:</em> %s</p>' %mi.pages if mi.pages else '',
+    MetadataIdentifier.PRINT_RUN: lambda mi, is_tale: '<p id="printRun"><em>Náklad (ks):</em> %s</p>' %mi.print_run if mi.print_run else '',
+    MetadataIdentifier.DIMENSIONS: lambda mi, is_tale: '<p id="dimensions"><em>Rozměry:</em> %s</p>' %mi.dimensions if mi.dimensions else '',
+    MetadataIdentifier.COVER_TYPE: lambda mi, is_tale: '<p id="coverType"><em>Vazba:</em> %s</p>' %mi.cover_type if mi.cover_type else '',
+    MetadataIdentifier.NOTE: lambda mi, is_tale: '<p id="note"><em>Poznámka:</em> %s</p>' %mi.note if mi.note else '',
+    MetadataIdentifier.ISSUE_NUMBER: lambda mi, is_tale: '<p id="issueNumber"><em>Vydání:</em> %s</p>' %mi.issue_number if mi.issue_number else '',
+    MetadataIdentifier.PRICE: lambda mi, is_tale: '<p id="price"><em>Cena:</em> %s</p>' %mi.price if mi.price else '',
+    MetadataIdentifier.TITLE: lambda mi, is_tale: '<p id="title"><em>Název:</em> %s</p>' %mi.mi_title if mi.mi_title else '',
+    MetadataIdentifier.SUBTITLE: lambda mi, is_tale: '<p id="subtitle"><em>Podtitul:</em> %s</p>' %mi.subtitle if mi.subtitle else '',
+    MetadataIdentifier.ORIGINAL_TITLE: lambda mi, is_tale: '<p id="origTitle"><em>Původní název:</em> %s</p>' %mi.original_title if mi.original_title else '',
+    MetadataIdentifier.ALT_ORIGINAL_TITLE: lambda mi, is_tale: '<p id="altOrigTitle"><em>Joný (obecně známý) název:</em> %s</p>' %mi.alt_original_title if mi.alt_original_title else '',
+    MetadataIdentifier.ORIGINAL_YEAR: lambda mi, is_tale: '<p id="origYear"><em>Rok prvního vydání:</em> %s</p>' %mi.original_year if mi.original_year else '',
+    MetadataIdentifier.PUB_YEAR: lambda mi, is_tale: '<p id="pubYear"><em>Rok vydání:</em> %s</p>' %mi.pubyear if mi.pubyear else '',
+    MetadataIdentifier.PUBLISHER: lambda mi, is_tale: '<p id="publisher"><em>Vydavatel:</em> %s</p>' %mi.mi_publisher if mi.mi_publisher else '',
+    MetadataIdentifier.WORLD: lambda mi, is_tale: '<p id="world"><em>Svět:</em> %s</p>' %mi.world if mi.world else '',
+    MetadataIdentifier.RATING: lambda mi, is_tale: '<p id="rating100"><em>Hodnocení (%%):</em> %s</p>' %mi.rating100 if mi.rating100 else '',
+    MetadataIdentifier.RATING10: lambda mi, is_tale: '<p id="rating10"><em>Hodnocení (0-10):</em> %s</p>' %mi.rating10 if mi.rating10 else '',
+    MetadataIdentifier.RATING5: lambda mi, is_tale: '<p id="rating5"><em>Hodnocení (0-5):</em> %s</p>' %mi.rating_star if mi.rating_star else '',
+    MetadataIdentifier.RATING_COUNT: lambda mi, is_tale: '<p id="ratingCount"><em>Počet hodnocení:</em> %s</p>' %mi.rating_count if mi.rating_count else '',
+    MetadataIdentifier.LANGUAGE: lambda mi, is_tale: '<p id="language"><em>Jazyk vydání:</em> %s </p>' %mi.mi_language if mi.mi_language else '',
+    MetadataIdentifier.ISBN: lambda mi, is_tale: '<p id="isbn"><em>ISBN:</em> %s </p>' %mi.mi_isbn if mi.mi_isbn else '',
+    MetadataIdentifier.EAN: lambda mi, is_tale: '<p id="ean"><em>EAN:</em> %s </p>' %mi.ean if mi.ean else '',
+    MetadataIdentifier.ORIG_ID: lambda mi, is_tale: ('<p id="legie_povidka"><em>legie povídka:</em> %s</p>' if is_tale else
+                                                     '<p id="legie"><em>legie:</em> %s</p>') %mi.mi_id if mi.mi_id else '',
+    MetadataIdentifier.SOURCE_RELEVANCE: lambda mi, is_tale: '<p id="relevance"><em>Pořadí ve vyhledávání:</em> %s</p>' %mi.source_relevance if mi.source_relevance else '',
+    MetadataIdentifier.SERIES: lambda mi, is_tale: ('<p id="series"><em>Série:</em> %s [%s]</p>' %(mi.mi_series, mi.mi_series_index) if mi.mi_series_index else
+                                                    '<p id="series"><em>Série:</em> %s</p>' %mi.mi_series) if mi.mi_series else '',
+    MetadataIdentifier.EDITION: lambda mi, is_tale: ('<p id="edition"><em>Edice:</em> %s [%s]</p>' %(mi.edition, mi.edition_index) if mi.edition_index else
+                                                     '<p id="edition"><em>Edice:</em> %s</p>' %mi.edition) if mi.edition else '',
+    MetadataIdentifier.CONTAINED_IN: lambda mi, is_tale: '<p id="containedIn"><em>Součástí knih:</em> <br>%s</p>'%('<br>'.join(mi.contained_in)) if mi.contained_in else '',
+    MetadataIdentifier.SEP_PUBLISHED: lambda mi, is_tale: '<p id="sepPublished"><em>Vydáno i samostatně jako:</em> %s</p>'%(', '.join(mi.sep_published)) if mi.sep_published else '',
+    MetadataIdentifier.ALT_TITLE: lambda mi, is_tale: '<p id="altTitleList"><em>Vydáno i pod názvy:</em> %s</p>'%(', '.join(mi.alt_title)) if mi.alt_title else '',
+    MetadataIdentifier.AUTHORS: lambda mi, is_tale: '<p id="authors"><em>Autoři:</em> %s</p>'%(' & '.join(mi.mi_authors)) if mi.mi_authors else '',
+    MetadataIdentifier.TRANSLATION: lambda mi, is_tale: '<p id="translator"><em>Překlad:</em> %s</p>'%(' & '.join(mi.translators)) if mi.translators else '',
+    MetadataIdentifier.ILLUSTRATION: lambda mi, is_tale: '<p id="illustrators"><em>Ilustrace:</em> %s</p>'%(' & '.join(mi.illustrators)) if mi.illustrators else '',
+    MetadataIdentifier.COVER_AUTHORS: lambda mi, is_tale: '<p id="coverAuthors"><em>Autoři obálky:</em> %s</p>'%(' & '.join(mi.cover_authors)) if mi.cover_authors else '',
+    MetadataIdentifier.CATEGORY: lambda mi, is_tale: '<p id="category"><em>Kategorie:</em> %s</p>' %', '.join(mi.category) if mi.category else '',
+    MetadataIdentifier.AWARDS: lambda mi, is_tale: '<p id="awards"><em>Ocenění:</em> <br>%s</p>' %'<br>'.join(mi.awards) if mi.awards else '',
+    MetadataIdentifier.TALES_IN_BOOK: lambda mi, is_tale: '<p id="bookParts"><em>Části díla:</em> <br>%s</p>' %'<br>'.join(mi.tales_in_book) if mi.tales_in_book else '',
+    MetadataIdentifier.EXTERNAL_LINKS: lambda mi, is_tale: '<p id="externalLinks"><em>Externí odkazy:</em> <br>%s</p>' %mi.external_links if mi.external_links else '',
+}
+
+# Raw field values used for tags and identifiers
+FIELD_VALUES = {
+    MetadataIdentifier.CATEGORY: lambda mi: mi.category,
+    MetadataIdentifier.PAGES: lambda mi: mi.pages,
+    MetadataIdentifier.AUTHORS: lambda mi: mi.mi_authors,
+    MetadataIdentifier.TRANSLATION: lambda mi: mi.translators,
+    MetadataIdentifier.ILLUSTRATION: lambda mi: mi.illustrators,
+    MetadataIdentifier.COVER_AUTHORS: lambda mi: mi.cover_authors,
+    MetadataIdentifier.TITLE: lambda mi: mi.mi_title,
+    MetadataIdentifier.SUBTITLE: lambda mi: mi.subtitle,
+    MetadataIdentifier.ALT_TITLE: lambda mi: mi.alt_title,
+    MetadataIdentifier.ORIGINAL_TITLE: lambda mi: mi.original_title,
+    MetadataIdentifier.ALT_ORIGINAL_TITLE: lambda mi: mi.alt_original_title,
+    MetadataIdentifier.SEP_PUBLISHED: lambda mi: mi.sep_published,
+    MetadataIdentifier.CONTAINED_IN: lambda mi: mi.contained_in,
+    MetadataIdentifier.WORLD: lambda mi: mi.world,
+    MetadataIdentifier.ORIGINAL_YEAR: lambda mi: mi.original_year,
+    MetadataIdentifier.PUB_YEAR: lambda mi: mi.pubyear,
+    MetadataIdentifier.PUBLISHER: lambda mi: mi.mi_publisher,
+    MetadataIdentifier.SERIES: lambda mi: (mi.mi_series, mi.mi_series_index),
+    MetadataIdentifier.EDITION: lambda mi: (mi.edition, mi.edition_index),
+    MetadataIdentifier.RATING: lambda mi: mi.rating100,
+    MetadataIdentifier.RATING5: lambda mi: mi.rating_star,
+    MetadataIdentifier.RATING10: lambda mi: mi.rating10,
+    MetadataIdentifier.RATING_COUNT: lambda mi: mi.rating_count,
+    MetadataIdentifier.ISBN: lambda mi: mi.mi_isbn,
+    MetadataIdentifier.EAN: lambda mi: mi.ean,
+    MetadataIdentifier.LANGUAGE: lambda mi: mi.mi_language,
+    MetadataIdentifier.PRICE: lambda mi: mi.price,
+    MetadataIdentifier.DIMENSIONS: lambda mi: mi.dimensions,
+    MetadataIdentifier.PRINT_RUN: lambda mi: mi.print_run,
+    MetadataIdentifier.ISSUE_NUMBER: lambda mi: mi.issue_number,
+    MetadataIdentifier.ORIG_ID: lambda mi: mi.mi_id,
+    MetadataIdentifier.COVER_TYPE: lambda mi: mi.cover_type,
+    MetadataIdentifier.NOTE: lambda mi: mi.note,
+    MetadataIdentifier.EXTERNAL_LINKS: lambda mi: mi.external_links,
+    MetadataIdentifier.AWARDS: lambda mi: mi.awards,
+    MetadataIdentifier.TALES_IN_BOOK: lambda mi: mi.tales_in_book,
+    MetadataIdentifier.SOURCE_RELEVANCE: lambda mi: mi.source_relevance,
+}
+
+def _tag_list(label, values):
+    return ['%s: %s'%(label, v.replace(',', ';')) for v in values]
+
+# Renderers for tags - (mi, is_tale) -> list of tags, called only for non empty field value
+TAG_RENDERERS = {
+    MetadataIdentifier.ORIG_ID: lambda mi, is_tale: ['%s: %s' %('legie povídka' if is_tale else 'legie', mi.mi_id.replace(',', ';'))],
+    MetadataIdentifier.TITLE: lambda mi, is_tale: ['Název: %s' %mi.mi_title.replace(',', ';')],
+    MetadataIdentifier.SUBTITLE: lambda mi, is_tale: ['Podtitul: %s' %mi.subtitle.replace(',', ';')],
+    MetadataIdentifier.PUBLISHER: lambda mi, is_tale: ['Vydavatel: %s' %mi.mi_publisher.replace(',', ';')],
+    MetadataIdentifier.ORIGINAL_TITLE: lambda mi, is_tale: ['Původní název: %s' %mi.original_title.replace(',', ';')],
+    MetadataIdentifier.NOTE: lambda mi, is_tale: ['Poznámka: %s' %mi.note.replace(',', ';')],
+    MetadataIdentifier.DIMENSIONS: lambda mi, is_tale: ['Rozměry: %s' %mi.dimensions.replace(',', ';')],
+    MetadataIdentifier.PRINT_RUN: lambda mi, is_tale: ['Náklad (ks): %s' %mi.print_run.replace(',', ';')],
+    MetadataIdentifier.ISSUE_NUMBER: lambda mi, is_tale: ['Vydání: %s' %mi.issue_number.replace(',', ';')],
+    MetadataIdentifier.COVER_TYPE: lambda mi, is_tale: ['Vazba: %s' %mi.cover_type.replace(',', ';')],
+    MetadataIdentifier.EDITION: lambda mi, is_tale: (['Edice: %s [%s]' %(mi.edition, mi.edition_index)] if mi.edition_index else
+                                                     ['Edice: %s' %mi.edition]) if mi.edition else [],
+    MetadataIdentifier.SERIES: lambda mi, is_tale: (['Série: %s [%s]' %(mi.mi_series, mi.mi_series_index)] if mi.mi_series_index else
+                                                    ['Série: %s' %mi.mi_series]) if mi.mi_series else [],
+    MetadataIdentifier.ALT_ORIGINAL_TITLE: lambda mi, is_tale: _tag_list('Jiný (obecně známý) název', mi.alt_original_title),
+    MetadataIdentifier.SEP_PUBLISHED: lambda mi, is_tale: _tag_list('Vydáno samostatně i jako', mi.sep_published),
+    MetadataIdentifier.CONTAINED_IN: lambda mi, is_tale: _tag_list('Součástí knihy', mi.contained_in),
+    MetadataIdentifier.AUTHORS: lambda mi, is_tale: _tag_list('Autor', mi.mi_authors),
+    MetadataIdentifier.TRANSLATION: lambda mi, is_tale: _tag_list('Překlad', mi.translators),
+    MetadataIdentifier.ILLUSTRATION: lambda mi, is_tale: _tag_list('Ilustrace', mi.illustrators),
+    MetadataIdentifier.COVER_AUTHORS: lambda mi, is_tale: _tag_list('Autor obálky', mi.cover_authors),
+    MetadataIdentifier.AWARDS: lambda mi, is_tale: _tag_list('Ocenění', mi.awards),
+    MetadataIdentifier.TALES_IN_BOOK: lambda mi, is_tale: _tag_list('Část díla', mi.tales_in_book),
+    MetadataIdentifier.ALT_TITLE: lambda mi, is_tale: _tag_list('Vydáno také pod názvem', mi.alt_title),
+    MetadataIdentifier.CATEGORY: lambda mi, is_tale: list(mi.category),
+    MetadataIdentifier.PAGES: lambda mi, is_tale: ['Počet stran: %s' %mi.pages],
+    MetadataIdentifier.EAN: lambda mi, is_tale: ['EAN: %s' %mi.ean],
+    MetadataIdentifier.LANGUAGE: lambda mi, is_tale: ['Jazyk vydání: %s' %mi.mi_language],
+    MetadataIdentifier.PRICE: lambda mi, is_tale: ['Cena: %s' %mi.price],
+    MetadataIdentifier.WORLD: lambda mi, is_tale: ['Svět: %s' %mi.world],
+    MetadataIdentifier.ORIGINAL_YEAR: lambda mi, is_tale: ['Rok prvního vydání: %s' %mi.original_year],
+    MetadataIdentifier.PUB_YEAR: lambda mi, is_tale: ['Rok vydání: %s' %mi.pubyear],
+    MetadataIdentifier.RATING: lambda mi, is_tale: ['Hodnocení (%%): %s' %mi.rating100],
+    MetadataIdentifier.RATING5: lambda mi, is_tale: ['Hodnocení (0-5): %s' %mi.rating_star],
+    MetadataIdentifier.RATING10: lambda mi, is_tale: ['Hodnocení (0-10): %s' %mi.rating10],
+    MetadataIdentifier.RATING_COUNT: lambda mi, is_tale: ['Počet hodnocení: %s' %mi.rating_count],
+    MetadataIdentifier.ISBN: lambda mi, is_tale: ['ISBN: %s' %mi.mi_isbn],
+    MetadataIdentifier.SOURCE_RELEVANCE: lambda mi, is_tale: ['Pořadí ve vyhledávání: %s' %mi.source_relevance],
+}
+
+IDENTIFIER_LIST_FIELDS = frozenset((MetadataIdentifier.CATEGORY, MetadataIdentifier.TAGS, MetadataIdentifier.AWARDS,
+                                    MetadataIdentifier.TALES_IN_BOOK, MetadataIdentifier.ALT_TITLE, MetadataIdentifier.SEP_PUBLISHED,
+                                    MetadataIdentifier.CONTAINED_IN, MetadataIdentifier.AUTHORS, MetadataIdentifier.TRANSLATION,
+                                    MetadataIdentifier.ILLUSTRATION, MetadataIdentifier.COVER_AUTHORS))
+IDENTIFIER_INDEXED_FIELDS = frozenset((MetadataIdentifier.SERIES, MetadataIdentifier.EDITION))
+
+# Values for title/publisher/series lines and series index field
+LINE_VALUES = dict(FIELD_VALUES)
+LINE_VALUES.update({
+    MetadataIdentifier.CATEGORY: lambda mi: ', '.join(mi.category),
+    MetadataIdentifier.AUTHORS: lambda mi: ' & '.join(mi.mi_authors),
+    MetadataIdentifier.ILLUSTRATION: lambda mi: ' & '.join(mi.illustrators),
+    MetadataIdentifier.TRANSLATION: lambda mi: ' & '.join(mi.translators),
+    MetadataIdentifier.COVER_AUTHORS: lambda mi: ' & '.join(mi.cover_authors),
+    MetadataIdentifier.SEP_PUBLISHED: lambda mi: ', '.join(mi.sep_published),
+    MetadataIdentifier.CONTAINED_IN: lambda mi: ', '.join(mi.contained_in),
+    MetadataIdentifier.ALT_TITLE: lambda mi: ', '.join(mi.alt_title),
+    MetadataIdentifier.SERIES: lambda mi: mi.mi_series,
+    MetadataIdentifier.SERIES_INDEX: lambda mi: mi.mi_series_index,
+    MetadataIdentifier.EDITION: lambda mi: mi.edition,
+    MetadataIdentifier.EDITION_INDEX: lambda mi: mi.edition_index,
+})
+
+
+def _compile_tag(argument):
+    value_of = FIELD_VALUES.get(argument, None)
+    render = TAG_RENDERERS.get(argument, None)
+    if value_of is None or render is None:
+        return None
+    def emit(mi, is_tale):
+        return render(mi, is_tale) if value_of(mi) else []
+    return emit
+
+def _compile_identifier(argument, key):
+    value_of = FIELD_VALUES.get(argument, lambda mi: '')
+    def emit(mi, is_tale):
+        appending = value_of(mi)
+        if argument in IDENTIFIER_LIST_FIELDS and appending:
+            appending = '| '.join([a.replace(',', ';') for a in appending])
+        elif argument in IDENTIFIER_INDEXED_FIELDS and appending:
+            if appending[0] and appending[1]:
+                appending = ' '.join([appending[0].replace(',', '|'), str(appending[1])])
+            elif appending[0]:
+                appending = appending[0].replace(',', '|')
+            else:
+                appending = None
+        elif isinstance(appending, str) and appending:
+            appending = appending.replace(',', '|')
+        if not appending:
+            return None
+        return ('legie_povidka' if is_tale and key == 'legie' else key), str(appending)
+    return emit
+
+def _compile_line_item(item):
+    if item[0] == MetadataIdentifier.CUSTOM_TEXT:
+        text = str(item[2])
+        return lambda mi: text
+    value_of = LINE_VALUES.get(item[0], None)
+    if value_of is None:
+        return None
+    def emit(mi):
+        appending = value_of(mi)
+        return str(appending) if appending else ''
+    return emit
+
+
+class CompiledBuilders(object):
+    '''
+    Configured comments, tags, identifiers and title/publisher/series lines
+    compiled into lists of emitters, one instance per preferences version
+    '''
+    __slots__ = ('comments', 'tags', 'identifiers', 'identifier_options',
+                 'title_line', 'publisher_line', 'series_line', 'series_index')
+
+    def __init__(self, prefs):
+        # (id_string, check_bool, visible_desc[, identifier_key])
+        self.comments = [COMMENT_RENDERERS.get(item[0], lambda mi, is_tale: '')
+                         for item in prefs.get(PluginPrefsName.APPEND_TO_COMMENTS) if item[1]]
+        self.tags = [e for e in (_compile_tag(item[0]) for item in prefs.get(PluginPrefsName.APPEND_TO_TAG) if item[1])
+                     if e is not None]
+        append_to_identifiers = prefs.get(PluginPrefsName.APPEND_TO_IDENTIFIERS)
+        self.identifier_options = dict([[item[0], item[1]] for item in append_to_identifiers])
+        self.identifiers = [_compile_identifier(item[0], item[3]) for item in append_to_identifiers if item[1]]
+        self.title_line = self._compile_line(prefs.get(PluginPrefsName.TITLE_LINE))
+        self.publisher_line = self._compile_line(prefs.get(PluginPrefsName.PUBLISHER_LINE))
+        self.series_line = self._compile_line(prefs.get(PluginPrefsName.SERIES_LINE))
+        series_index_field = prefs.get(PluginPrefsName.SERIES_INDEX_FIELD)
+        self.series_index = LINE_VALUES.get(series_index_field[0], None) if series_index_field[1] else None
+
+    @staticmethod
+    def _compile_line(line):
+        return [e for e in (_compile_line_item(item) for item in line if item[1]) if e is not None]
+
+    def identifier_enabled(self, argument):
+        return self.identifier_options.get(argument, True)
+
+    def build_comments(self, mi, is_tale):
+        return ''.join([' %s'%render(mi, is_tale) for render in self.comments])
+
+    def build_tags(self, mi, is_tale):
+        tags = []
+        for emit in self.tags:
+            tags.extend(emit(mi, is_tale))
+        return tags
+
+    def build_identifiers(self, mi, is_tale):
+        return [i for i in (emit(mi, is_tale) for emit in self.identifiers) if i is not None]
+
+    @staticmethod
+    def build_line(line, mi):
+        return ''.join([emit(mi) for emit in line])
+
+    def build_series_index(self, mi):
+        appending = self.series_index(mi) if self.series_index is not None else None
+        return float(appending) if appending else None
+
+
+def get_builders(prefs):
+    '''
+    Returns compiled builders for preferences snapshot (compiled once per preferences version)
+    '''
+    return prefs.compiled('builders', CompiledBuilders)
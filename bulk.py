@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+import io
+import time
+from collections import OrderedDict
+from threading import Lock, Event, local
+
+from .pool import tuner
+
+# memory limit of responses kept by SharedBrowser
+SHARED_RESPONSES_BYTES = 64 * 1024 * 1024
+
+
+class CachedResponse(object):
+    def __init__(self, url, data, headers):
+        self.url, self.data, self.headers = url, data, headers
+        self.stream = io.BytesIO(data)
+
+    def read(self, *args):
+        return self.stream.read(*args)
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def close(self):
+        pass
+
+
+class SharedBrowser(object):
+    '''
+    Browser shared by all searches and workers of one identify run. Same url
+    requested by more books (same query, same book page) is downloaded only once,
+    concurrent requests of same url wait for the first one.
+    Every thread uses its own clone of wrapped browser.
+    '''
+
+    def __init__(self, browser, max_bytes=SHARED_RESPONSES_BYTES):
+        self.browser, self.max_bytes = browser, max_bytes
+        self.addheaders = list(browser.addheaders)
+        self.lock = Lock()
+        self.local = local()
+        # url -> (final url, data, headers), least recently used first
+        self.responses = OrderedDict()
+        self.size = 0
+        # url -> Event of request in progress
+        self.loading = {}
+        self.requests = self.hits = 0
+
+    def clone_browser(self):
+        # workers clone their browser, the clone has to share responses
+        return self
+
+    def set_header(self, *args):
+        self.browser.set_header(*args)
+
+    def set_simple_cookie(self, *args, **kwargs):
+        self.browser.set_simple_cookie(*args, **kwargs)
+
+    def thread_browser(self):
+        br = getattr(self.local, 'browser', None)
+        if br is None:
+            br = self.local.browser = self.browser.clone_browser()
+        return br
+
+    def cached(self, url):
+        with self.lock:
+            entry = self.responses.get(url, None)
+            if entry is not None:
+                self.responses.move_to_end(url)
+                self.hits += 1
+            return entry
+
+    def open_novisit(self, url, timeout=30, **kwargs):
+        url = str(url)
+        while True:
+            entry = self.cached(url)
+            if entry is not None:
+                return CachedResponse(*entry)
+            with self.lock:
+                event = self.loading.get(url, None)
+                if event is None:
+                    event = self.loading[url] = Event()
+                    break
+            # same url is downloaded by other thread, when its request fails
+            # (nothing is cached) this thread tries it again
+            event.wait(timeout)
+
+        try:
+            with self.lock:
+                self.requests += 1
+            start = time.time()
+            response = self.thread_browser().open_novisit(url, timeout=timeout, **kwargs)
+            data = response.read()
+            tuner.observe(time.time() - start)
+            entry = (response.geturl(), data, dict((k, v) for k, v in response.info().items()))
+            self.store(url, entry)
+            return CachedResponse(*entry)
+        finally:
+            with self.lock:
+                self.loading.pop(url, None)
+            event.set()
+
+    open = open_novisit
+
+    def open_conditional(self, url, etag=None, last_modified=None, timeout=30):
+        '''
+        Conditional request with validators of previous response, returns None
+        when page is not modified. Downloaded page is shared as other responses.
+        '''
+        url = str(url)
+        headers = []
+        if etag:
+            headers.append(('If-None-Match', etag))
+        if last_modified:
+            headers.append(('If-Modified-Since', last_modified))
+        if not headers:
+            return self.open_novisit(url, timeout=timeout)
+        br = self.thread_browser().clone_browser()
+        br.addheaders = list(br.addheaders) + headers
+        with self.lock:
+            self.requests += 1
+        start = time.time()
+        try:
+            response = br.open_novisit(url, timeout=timeout)
+            data = response.read()
+        except Exception as e:
+            if getattr(e, 'code', None) == 304:
+                return None
+            raise
+        tuner.observe(time.time() - start)
+        entry = (response.geturl(), data, dict((k, v) for k, v in response.info().items()))
+        self.store(url, entry)
+        return CachedResponse(*entry)
+
+    def store(self, url, entry):
+        with self.lock:
+            if url in self.responses:
+                return
+            self.responses[url] = entry
+            self.size += len(entry[1])
+            while self.size > self.max_bytes and len(self.responses) > 1:
+                _, old = self.responses.popitem(last=False)
+                self.size -= len(old[1])
+
+
+class BookQueue(object):
+    '''
+    Result queue of one book in bulk identify, puts (book index, Metadata) into shared
+    result queue and (book index, None) once all workers of the book are finished.
+    Book progress is recorded in job journal (when used).
+    '''
+
+    def __init__(self, result_queue, index, journal=None):
+        self.result_queue, self.index, self.journal = result_queue, index, journal
+        self.lock = Lock()
+        self.pending = self.workers = self.results = 0
+        self.closed = False
+
+    def put(self, mi):
+        with self.lock:
+            self.results += 1
+        self.result_queue.put((self.index, mi))
+
+    def searched(self, matches):
+        if self.journal is not None:
+            from .journal import SEARCHED
+            self.journal.set_state(self.index, SEARCHED, matches)
+
+    def add_workers(self, count):
+        with self.lock:
+            self.pending += count
+            self.workers += count
+
+    def worker_finished(self):
+        with self.lock:
+            self.pending -= 1
+            finished = self.pending <= 0
+        if finished:
+            if self.journal is not None:
+                from .journal import FETCHED
+                self.journal.set_state(self.index, FETCHED)
+            self.done()
+
+    def done(self, finished=True):
+        '''
+        finished=False - book was not completed (abort, failed request), resumed job repeats it
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.result_queue.put((self.index, None))
+        # workers without any result (e.g. failed download) are run again by resumed job
+        if finished and self.journal is not None and (self.results or not self.workers):
+            from .journal import EMITTED
+            self.journal.set_state(self.index, EMITTED)
+
+
+class SingleBookQueue(object):
+    '''
+    Adapter of bulk identify results for single book identify
+    '''
+
+    def __init__(self, result_queue):
+        self.result_queue = result_queue
+
+    def put(self, item):
+        index, mi = item
+        if mi is not None:
+            self.result_queue.put(mi)
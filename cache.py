@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+import os
+import json
+import time
+import sqlite3
+from threading import local, Lock
+
+# namespaces and their time to live (seconds)
+COVER_URLS = 'cover_urls'
+ISBN_TO_ID = 'isbn_to_id'
+OBALKYKNIH = 'obalkyknih'
+FINGERPRINTS = 'fingerprints'
+SERIES = 'series'
+DAY = 24 * 60 * 60
+TTL = {
+    COVER_URLS: 30 * DAY,
+    ISBN_TO_ID: 180 * DAY,
+    OBALKYKNIH: 14 * DAY,
+    FINGERPRINTS: 365 * DAY,
+    SERIES: 30 * DAY,
+}
+DEFAULT_TTL = 30 * DAY
+MAX_ENTRIES = 20_000
+# namespaces with own size limit (one entry per library book)
+NAMESPACE_MAX_ENTRIES = {
+    FINGERPRINTS: 200_000,
+}
+# eviction runs once per this number of writes
+EVICT_EVERY = 200
+
+
+class PersistentCache(object):
+    '''
+    Small key/value store (SQLite in WAL mode) shared by all calibre processes
+    (GUI and bulk metadata download jobs), values are stored as JSON
+    '''
+
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        self.path, self.max_entries = path, max_entries
+        self.local = local()
+        self.lock = Lock()
+        self.writes = 0
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS kv (namespace TEXT NOT NULL, key TEXT NOT NULL, '
+                         'value TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (namespace, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS kv_updated ON kv (updated)')
+            conn.commit()
+            self.local.conn = conn
+        return conn
+
+    def get(self, namespace, key, ttl=None):
+        if key is None:
+            return None
+        ttl = TTL.get(namespace, DEFAULT_TTL) if ttl is None else ttl
+        try:
+            row = self.connection().execute('SELECT value FROM kv WHERE namespace=? AND key=? AND updated>=?',
+                                            (namespace, str(key), time.time() - ttl)).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value):
+        if key is None:
+            return
+        try:
+            conn = self.connection()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO kv (namespace, key, value, updated) VALUES (?, ?, ?, ?)',
+                             (namespace, str(key), json.dumps(value), time.time()))
+        except sqlite3.Error:
+            return
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def delete(self, namespace, key):
+        try:
+            conn = self.connection()
+            with conn:
+                conn.execute('DELETE FROM kv WHERE namespace=? AND key=?', (namespace, str(key)))
+        except sqlite3.Error:
+            pass
+
+    def evict(self):
+        '''
+        Removes expired entries and the oldest ones above size limit
+        '''
+        now = time.time()
+        try:
+            conn = self.connection()
+            with conn:
+                for namespace, ttl in TTL.items():
+                    conn.execute('DELETE FROM kv WHERE namespace=? AND updated<?', (namespace, now - ttl))
+                conn.execute('DELETE FROM kv WHERE namespace NOT IN (%s) AND updated<?'%','.join('?'*len(TTL)),
+                             tuple(TTL) + (now - DEFAULT_TTL,))
+                for namespace, max_entries in NAMESPACE_MAX_ENTRIES.items():
+                    conn.execute('DELETE FROM kv WHERE rowid IN (SELECT rowid FROM kv WHERE namespace=? '
+                                 'ORDER BY updated DESC LIMIT -1 OFFSET ?)', (namespace, max_entries))
+                conn.execute('DELETE FROM kv WHERE rowid IN (SELECT rowid FROM kv WHERE namespace NOT IN (%s) '
+                             'ORDER BY updated DESC LIMIT -1 OFFSET ?)'%','.join('?'*len(NAMESPACE_MAX_ENTRIES)),
+                             tuple(NAMESPACE_MAX_ENTRIES) + (self.max_entries,))
+        except sqlite3.Error:
+            pass
+
+
+_cache = None
+_cache_lock = Lock()
+
+def get_cache():
+    '''
+    Returns process wide cache stored in calibre cache directory
+    '''
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from calibre.constants import cache_dir
+            base = os.path.join(cache_dir(), 'legie')
+            os.makedirs(base, exist_ok=True)
+            _cache = PersistentCache(os.path.join(base, 'cache.sqlite'))
+        return _cache
@@ -7,64 +7,58 @@ __license__   = 'GPL v3'
 __copyright__ = '2024 seeder'
 __docformat__ = 'restructuredtext en'
 
-from functools import total_ordering
+from functools import total_ordering, lru_cache
 from polyglot.builtins import cmp
-from .utils import strip_accents
+from .utils import strip_accents, strip_accents_cached
 from .prefs import PluginPrefsName
 
 
-@total_ordering
-class MetadataCompareKeyGen:
-    def __init__(self, mi, source_plugin, title, authors, identifiers):
-        if not mi:
-            self.base = (2,2,2,2,2,2,2,2,2,2,2,2,2)
-            self.comments_len = 0
-            self.extra = 0
-            return
-
-        title, identifiers = source_plugin.search_title_for_metadata(title, identifiers)
-
-        isbn = 1 if mi.isbn and identifiers.get('isbn', None) is not None \
-                and mi.isbn == identifiers.get('isbn', None) else 2
-
-        all_fields = 1 if source_plugin.test_fields(mi) is None else 2
-
-        cl_title = title
-        cl_title_mi = mi.title
-
-        exact_title = 1 if title and \
-                cl_title ==cl_title_mi else 2
-
-        exact_clean_title = 1 if cl_title and cl_title_mi and \
-                strip_accents(cl_title.lower()).replace('-', ' ') == strip_accents(cl_title_mi.lower()).replace('-', ' ') else 2
-
-        contains_title = 1 if cl_title and cl_title_mi and \
-                cl_title in cl_title_mi else 2
-
-        contains_clean_title = 1 if title and \
-                strip_accents(cl_title.lower()).replace('-', ' ') in strip_accents(cl_title_mi.lower()).replace('-', ' ') else 2
-
+def match_confidence(mi, title, authors, identifiers):
+    '''
+    Returns confidence (0-100) that mi is the wanted book, from the same signals
+    as MetadataCompareKeyGen - exact clean title (40), authors surname (30), ISBN/EAN (30)
+    '''
+    if not mi:
+        return 0
+    score = 0
+    if title and mi.title and \
+            strip_accents(title.lower()).replace('-', ' ') == strip_accents(mi.title.lower()).replace('-', ' '):
+        score += 40
+
+    if authors and mi.authors:
+        auths = {strip_accents(a.split(" ")[-1]).lower() for a in authors}
+        miauths = {strip_accents_cached(a.split(" ")[-1]).lower() for a in mi.authors}
+        if auths & miauths:
+            score += 30
+
+    wanted = [identifiers.get(i, None) for i in ('isbn', 'ean')]
+    found = (mi.isbn, mi.identifiers.get('ean', None))
+    if any(w and w in found for w in wanted):
+        score += 30
+    return score
+
+class MetadataCompareContext:
+    '''
+    Query side of MetadataCompareKeyGen - computed once per query (title, authors, identifiers)
+    and shared by keys of all candidates
+    '''
+    def __init__(self, source_plugin, title, authors, identifiers):
+        self.source_plugin = source_plugin
+        title, identifiers = source_plugin.search_title_for_metadata(title, dict(identifiers or {}))
+        self.title = title
+        self.isbn = identifiers.get('isbn', None)
+        self.clean_title = strip_accents(title.lower()).replace('-', ' ') if title else None
+        self.title_tokens = set(strip_accents(title).replace('-', '').lower().split()) if title else set()
 
         auths = []
         if authors:
             for a in authors:
                 auths.append(strip_accents(a.split(" ")[-1]).lower())
-        miauths = []
-        for a in mi.authors:
-            miauths.append(strip_accents(a.split(" ")[-1]).lower())
-
-        author_segments = list(set(miauths) & set(auths)) #authors surname list compare
-        title_segments = list(set(strip_accents(mi.title.lower()).replace('-', '').split()) & set(strip_accents(title).replace('-', '').lower().split())) #authors surname list compare
-
-        has_cover = 2 if (not source_plugin.cached_cover_url_is_reliable or
-                source_plugin.get_cached_cover_url(mi.identifiers) is None) else 1
-        
-        author_match_relevance = getattr(mi, 'author_match_relevance', 2)
-        title_relevance = getattr(mi, 'title_relevance', 2)
+        self.auths = set(auths)
 
         # compare wanted year from Identifiers in title (pubyear:2000 or pubdate:2000)
-        wanted_year = source_plugin.identifiers.get('pubdate', None)
-        wanted_lang = source_plugin.identifiers.get('language', None)
+        wanted_year = identifiers.get('pubdate', None)
+        wanted_lang = identifiers.get('language', None)
         issue_pref = source_plugin.get_pref(PluginPrefsName.ISSUE_PREFERENCE)
         if not wanted_year and issue_pref in (1, 3):
             wanted_year = 10000 #MAX_VAL
@@ -74,16 +68,94 @@ class MetadataCompareKeyGen:
             wanted_lang = 'cs'
         elif not wanted_lang and issue_pref in (3, 4):
             wanted_lang = 'sk'
-        pubyear = getattr(mi, 'pubyear', None)
-        language = getattr(mi, 'language', None)
-        if wanted_year and pubyear:
-            closest_year = abs(int(wanted_year) - int(pubyear))
-        else:
-            closest_year = 0
-        closest_lang = 0 if language == wanted_lang else 2
-        
-
-        self.base = (author_match_relevance, title_relevance, exact_title, exact_clean_title, contains_title, -len(title_segments), contains_clean_title, -len(author_segments), closest_lang, closest_year, all_fields, isbn, has_cover)
+        self.wanted_year = int(wanted_year) if wanted_year else wanted_year
+        self.wanted_lang = wanted_lang
+        self.cover_reliable = source_plugin.cached_cover_url_is_reliable
+
+
+@lru_cache(maxsize=4096)
+def title_features(title):
+    '''
+    Returns (clean title, title words) of candidate title, issues of one book and
+    the same book found by more searches share them
+    '''
+    return strip_accents(title.lower()).replace('-', ' '), frozenset(strip_accents(title.lower()).replace('-', '').split())
+
+
+def candidate_base(mi, source_plugin, context):
+    '''
+    Returns MetadataCompareKeyGen.base tuple of candidate mi for query context
+    '''
+    title = context.title
+
+    isbn = 1 if mi.isbn and context.isbn is not None \
+            and mi.isbn == context.isbn else 2
+
+    all_fields = 1 if source_plugin.test_fields(mi) is None else 2
+
+    cl_title_mi = mi.title
+    clean_title_mi, title_words_mi = title_features(cl_title_mi) if cl_title_mi else (None, frozenset())
+
+    exact_title = 1 if title and \
+            title == cl_title_mi else 2
+
+    exact_clean_title = 1 if title and cl_title_mi and \
+            context.clean_title == clean_title_mi else 2
+
+    contains_title = 1 if title and cl_title_mi and \
+            title in cl_title_mi else 2
+
+    contains_clean_title = 1 if title and \
+            context.clean_title in clean_title_mi else 2
+
+    miauths = set()
+    for a in mi.authors:
+        miauths.add(strip_accents_cached(a.split(" ")[-1]).lower())
+
+    author_segments = miauths & context.auths #authors surname list compare
+    title_segments = title_words_mi & context.title_tokens #title words compare
+
+    has_cover = 2 if (not context.cover_reliable or
+            source_plugin.get_cached_cover_url(mi.identifiers) is None) else 1
+    
+    author_match_relevance = getattr(mi, 'author_match_relevance', 2)
+    title_relevance = getattr(mi, 'title_relevance', 2)
+
+    pubyear = getattr(mi, 'pubyear', None)
+    language = getattr(mi, 'language', None)
+    if context.wanted_year and pubyear:
+        closest_year = abs(context.wanted_year - int(pubyear))
+    else:
+        closest_year = 0
+    closest_lang = 0 if language == context.wanted_lang else 2
+
+    return (author_match_relevance, title_relevance, exact_title, exact_clean_title, contains_title, -len(title_segments), contains_clean_title, -len(author_segments), closest_lang, closest_year, all_fields, isbn, has_cover)
+
+
+def sort_candidates(mi_list, source_plugin, context):
+    '''
+    Returns mi_list ordered the same way as sorting by MetadataCompareKeyGen,
+    shared per-query work is done once in context
+    '''
+    def key(mi):
+        if not mi:
+            return (2,2,2,2,2,2,2,2,2,2,2,2,2,0)
+        return candidate_base(mi, source_plugin, context) + (getattr(mi, 'source_relevance', 0), )
+    return sorted(mi_list, key=key)
+
+
+@total_ordering
+class MetadataCompareKeyGen:
+    def __init__(self, mi, source_plugin, title, authors, identifiers, context=None):
+        if not mi:
+            self.base = (2,2,2,2,2,2,2,2,2,2,2,2,2)
+            self.comments_len = 0
+            self.extra = 0
+            return
+
+        if context is None:
+            context = MetadataCompareContext(source_plugin, title, authors, identifiers)
+        self.base = candidate_base(mi, source_plugin, context)
         self.extra = (getattr(mi, 'source_relevance', 0), )
 
     def compare_to_other(self, other):
@@ -27,7 +27,7 @@ from calibre.gui2.metadata.config import ConfigWidget as DefaultConfigWidget
 
 from .shared.ui_components import BuilderWidget, MappingsTableWidget, BuilderTableType
 from .shared.prefs import PluginPrefsName, MetadataIdentifier, MetadataName, TranslatingStrings
-from .prefs import DEFAULT_STORE_VALUES, DEFAULT_CATEGORY_MAPPINGS, LINE_OPTIONS, COMMENT_OPTIONS, IDENTIFIER_OPTIONS, TAG_OPTIONS, get_pref, set_pref
+from .prefs import LegiePrefsName, DEFAULT_STORE_VALUES, DEFAULT_CATEGORY_MAPPINGS, LINE_OPTIONS, COMMENT_OPTIONS, IDENTIFIER_OPTIONS, TAG_OPTIONS, get_pref, set_pref
 
 # python/pyqt backwards compability
 from calibre import as_unicode
@@ -114,6 +114,8 @@ class ConfigWidget(DefaultConfigWidget):
     def connect_widget_value(self):
         connected = {}
         connected[PluginPrefsName.KEY_MAX_DOWNLOADS] = self.search_tab.max_downloads_spin
+        connected[LegiePrefsName.MAX_WORKERS] = self.search_tab.max_workers_spin
+        connected[LegiePrefsName.CONFIDENCE_THRESHOLD] = self.search_tab.confidence_threshold_spin
         connected[PluginPrefsName.MAX_COVERS] = self.search_tab.max_covers_spin
         connected[PluginPrefsName.OBALKYKNIH_COVER] = self.search_tab.obalkyknih_cover_check
         connected[PluginPrefsName.KEY_CATEGORY_MAPPINGS] = self.tag_tab.table_widget
@@ -222,6 +224,14 @@ class SearchTab(QWidget):
         self.max_downloads_spin = add_spin_option(other_group_box_layout, TranslatingStrings.MAX_DOWNLOADS_TITLE,
                                                   TranslatingStrings.MAX_DOWNLOADS_INFO,
                                                   PluginPrefsName.KEY_MAX_DOWNLOADS)
+        self.max_workers_spin = add_spin_option(other_group_box_layout, _('Maximum of parallel downloads'),
+                                                _('Upper limit of book pages downloaded at the same time.\n'\
+                                                  'Plugin lowers the number automatically when legie.info responds slowly.'),
+                                                LegiePrefsName.MAX_WORKERS, max_val=10)
+        self.confidence_threshold_spin = add_spin_option(other_group_box_layout, _('Stop searching at match confidence (%)'),
+                                                _('When found book reaches this confidence, remaining books are not downloaded.\n'\
+                                                  'Exact title: 40 %, author surname: 30 %, ISBN/EAN: 30 %. Value 0 disables this option.'),
+                                                LegiePrefsName.CONFIDENCE_THRESHOLD, min_val=0, max_val=100)
 
         search_group_box = QGroupBox(_('Searching priority'), self)
         search_group_box_layout = QHBoxLayout()
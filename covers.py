@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+import os
+import time
+import struct
+from hashlib import sha1
+from threading import Lock
+
+from .pool import map_ordered
+
+# smaller images are placeholders (e.g. 'no cover' icons)
+MIN_COVER_BYTES = 2048
+MIN_COVER_SIDE = 100
+# header probe reads only first bytes of image
+PROBE_BYTES = 16 * 1024
+# JPEG start of frame markers (without DHT, JPG and DAC)
+JPEG_SOF = frozenset(range(0xc0, 0xd0)) - frozenset((0xc4, 0xc8, 0xcc))
+# on disk image cache limit (least recently used images are removed above it)
+IMAGE_CACHE_BYTES = 200 * 1024 * 1024
+
+
+def header_size(data):
+    '''
+    Returns (width, height) parsed from JPEG/PNG/GIF header bytes or None
+    '''
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 4 <= len(data):
+            if data[i] != 0xff:
+                i += 1
+                continue
+            marker = data[i+1]
+            if marker == 0xff:
+                i += 1
+                continue
+            if marker == 0x01 or 0xd0 <= marker <= 0xd9:
+                i += 2
+                continue
+            if marker in JPEG_SOF:
+                if i + 9 > len(data):
+                    return None
+                height, width = struct.unpack('>HH', data[i+5:i+9])
+                return width, height
+            i += 2 + struct.unpack('>H', data[i+2:i+4])[0]
+    return None
+
+
+def image_size(data):
+    '''
+    Returns (width, height) of image data or None when it is not known image
+    '''
+    size = header_size(data)
+    if size is not None:
+        return size
+    try:
+        from calibre.utils.imghdr import identify
+        fmt, width, height = identify(data)
+    except:
+        return None
+    if fmt is None or width < 0 or height < 0:
+        return None
+    return width, height
+
+def is_placeholder(data):
+    if not data or len(data) < MIN_COVER_BYTES:
+        return True
+    size = image_size(data)
+    return size is not None and min(size) < MIN_COVER_SIDE
+
+
+class ImageCache(object):
+    '''
+    Cover images stored on disk by content hash (same image from more urls is stored once),
+    url index with validators (ETag, Last-Modified) is kept in plugin SQLite cache.
+    Cached images are revalidated with conditional requests.
+    '''
+
+    def __init__(self, path, conn_factory, max_bytes=IMAGE_CACHE_BYTES):
+        self.path, self.conn_factory, self.max_bytes = path, conn_factory, max_bytes
+        self.lock = Lock()
+        self.prepared = False
+        # running total of stored files size, eviction runs only once it crosses the limit
+        self.total = None
+
+    def connection(self):
+        conn = self.conn_factory()
+        if not self.prepared:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS images (url TEXT PRIMARY KEY, sha1 TEXT NOT NULL, '
+                             'etag TEXT, last_modified TEXT, size INTEGER NOT NULL, used REAL NOT NULL)')
+            self.prepared = True
+        return conn
+
+    def file_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    def lookup(self, url):
+        '''
+        Returns (data, etag, last_modified) of cached image or None
+        '''
+        try:
+            row = self.connection().execute('SELECT sha1, etag, last_modified FROM images WHERE url=?', (url,)).fetchone()
+            if row is None:
+                return None
+            with open(self.file_path(row[0]), 'rb') as f:
+                return f.read(), row[1], row[2]
+        except:
+            return None
+
+    def touch(self, url):
+        try:
+            conn = self.connection()
+            with conn:
+                conn.execute('UPDATE images SET used=? WHERE url=?', (time.time(), url))
+        except:
+            pass
+
+    def store(self, url, data, etag=None, last_modified=None):
+        digest = sha1(data).hexdigest()
+        try:
+            path = self.file_path(digest)
+            created = not os.path.exists(path)
+            if created:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = '%s.%s.tmp'%(path, os.getpid())
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            conn = self.connection()
+            orphan = None
+            with conn:
+                old = conn.execute('SELECT sha1, size FROM images WHERE url=?', (url,)).fetchone()
+                conn.execute('INSERT OR REPLACE INTO images (url, sha1, etag, last_modified, size, used) VALUES (?, ?, ?, ?, ?, ?)',
+                             (url, digest, etag, last_modified, len(data), time.time()))
+                # changed image of url - previous file is removed when no other url uses it
+                if old is not None and old[0] != digest and \
+                        conn.execute('SELECT 1 FROM images WHERE sha1=? LIMIT 1', (old[0],)).fetchone() is None:
+                    orphan = old
+            if orphan is not None:
+                try:
+                    os.remove(self.file_path(orphan[0]))
+                except OSError:
+                    pass
+        except:
+            return
+        with self.lock:
+            if self.total is None:
+                self.total = self.stored_size(conn)
+            else:
+                if created:
+                    self.total += len(data)
+                if orphan is not None:
+                    self.total -= orphan[1]
+            over_limit = self.total > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    @staticmethod
+    def stored_size(conn):
+        # size of stored files (one file for all urls with same content)
+        return conn.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM images GROUP BY sha1)').fetchone()[0]
+
+    def evict(self):
+        '''
+        Removes least recently used image files (with all their urls) while total size is above limit
+        '''
+        with self.lock:
+            try:
+                conn = self.connection()
+                # other calibre processes share the cache, running total is corrected here
+                self.total = self.stored_size(conn)
+                removed = []
+                for digest, size in conn.execute('SELECT sha1, MAX(size) FROM images GROUP BY sha1 ORDER BY MAX(used)').fetchall():
+                    if self.total <= self.max_bytes:
+                        break
+                    removed.append(digest)
+                    self.total -= size
+                with conn:
+                    conn.executemany('DELETE FROM images WHERE sha1=?', [(d,) for d in removed])
+                for digest in removed:
+                    try:
+                        os.remove(self.file_path(digest))
+                    except OSError:
+                        pass
+            except:
+                self.total = None
+
+    def fetch(self, log, browser, url, timeout):
+        '''
+        Returns image data for url, unchanged cached image is not downloaded again
+        '''
+        cached = self.lookup(url)
+        headers = []
+        if cached is not None:
+            if cached[1]:
+                headers.append(('If-None-Match', cached[1]))
+            if cached[2]:
+                headers.append(('If-Modified-Since', cached[2]))
+        try:
+            br = browser.clone_browser()
+            if headers:
+                br.addheaders = list(br.addheaders) + headers
+            response = br.open_novisit(url, timeout=timeout)
+            data = response.read()
+            info = response.info()
+        except Exception as e:
+            if cached is not None and getattr(e, 'code', None) == 304:
+                log.info('Cover not modified, using cached - %s' % url)
+                self.touch(url)
+                return cached[0]
+            raise
+        self.store(url, data, info.get('ETag', None), info.get('Last-Modified', None))
+        return data
+
+
+_image_cache = None
+_image_cache_lock = Lock()
+
+def get_image_cache():
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            from .cache import get_cache
+            cache = get_cache()
+            _image_cache = ImageCache(os.path.join(os.path.dirname(cache.path), 'covers'), cache.connection)
+        return _image_cache
+
+
+def download_covers(log, browser, urls, timeout, max_workers, abort, get_best_cover=False):
+    '''
+    Downloads cover urls concurrently, returns image data in urls order
+    without duplicates (same content from different sites) and placeholders.
+    When only the best cover is wanted (get_best_cover) and there are more
+    candidates, only image headers are probed first and only the best one
+    is downloaded in full (all covers are downloaded anyway otherwise).
+    '''
+    urls = [u for u in urls if u]
+    image_cache = get_image_cache()
+
+    def download(url):
+        try:
+            return image_cache.fetch(log, browser, url, timeout)
+        except:
+            log.exception('*** Failed to download cover - %s' % url)
+            return None
+
+    def probe(url):
+        '''
+        Returns (url, size, length, data) - data only when whole image fit into probe
+        '''
+        cached = image_cache.lookup(url)
+        if cached is not None:
+            # full download revalidates cached image with conditional request
+            return url, image_size(cached[0]), len(cached[0]), None
+        try:
+            response = browser.clone_browser().open_novisit(url, timeout=timeout)
+            try:
+                head = response.read(PROBE_BYTES)
+                length = response.info().get('Content-Length', None)
+            finally:
+                response.close()
+        except:
+            log.exception('*** Failed to probe cover - %s' % url)
+            return None
+        data = head if len(head) < PROBE_BYTES else None
+        length = int(length) if length and length.isdigit() else len(head)
+        return url, header_size(head), length, data
+
+    if get_best_cover and len(urls) > 1:
+        candidates = []
+        for p in map_ordered(probe, urls, max_workers, abort):
+            if p is None:
+                continue
+            url, size, length, data = p
+            if length < MIN_COVER_BYTES or (size is not None and min(size) < MIN_COVER_SIDE):
+                log.info('Skipping placeholder cover - %s' % url)
+                continue
+            candidates.append(p)
+        if candidates:
+            # biggest resolution, then biggest file
+            candidates = [max(candidates, key=lambda p: ((p[1][0] * p[1][1]) if p[1] else 0, p[2]))]
+        log.info('Covers selected after probing: %s' % [p[0] for p in candidates])
+        urls = [p[0] for p in candidates]
+        probed = dict((p[0], p[3]) for p in candidates if p[3] is not None)
+        fetch = lambda url: probed[url] if url in probed else download(url)
+    else:
+        fetch = download
+
+    covers = []
+    seen = set()
+    for url, cdata in zip(urls, map_ordered(fetch, urls, max_workers, abort)):
+        if cdata is None:
+            continue
+        if is_placeholder(cdata):
+            log.info('Skipping placeholder cover - %s' % url)
+            continue
+        digest = sha1(cdata).hexdigest()
+        if digest in seen:
+            log.info('Skipping duplicate cover - %s' % url)
+            continue
+        seen.add(digest)
+        covers.append(cdata)
+    return covers
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+# Offline evaluation of identify ranking quality and cost.
+#
+# Cases file has one JSON object per line:
+#     {"title": "Čaroprávnost", "authors": ["Terry Pratchett"], "identifiers": {}, "expected": "103"}
+# Cover cases check cover resolved from issues page without identify (first cover url):
+#     {"title": "Mort", "identifiers": {"legie": "104"}, "expected_cover": "https://www.legie.info/..."}
+#
+# Record fixtures once (real network), then replay them offline after changes:
+#     calibre-debug -e evaluate.py -- cases.jsonl fixtures/ --record
+#     calibre-debug -e evaluate.py -- cases.jsonl fixtures/
+#
+# Every case runs with empty plugin caches in temporary directory, so results
+# do not depend on earlier runs (cached cover urls, ISBN mapping, obalkyknih, covers).
+#
+# Sample cases with fixtures (trimmed legie pages, replay only, default plugin preferences):
+#     calibre-debug -e evaluate.py -- evaluation/cases.jsonl evaluation/fixtures/
+#
+# Reports top-1 accuracy, number of HTTP requests and wall time per case.
+
+import os
+import io
+import json
+import time
+import shutil
+import tempfile
+from hashlib import sha1
+from threading import Lock, Event
+
+try:
+    from queue import Empty, Queue
+except ImportError:
+    from Queue import Empty, Queue
+
+
+class FixtureResponse(object):
+    def __init__(self, url, data, headers):
+        self.url, self.headers = url, headers
+        self.stream = io.BytesIO(data)
+
+    def read(self, *args):
+        return self.stream.read(*args)
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def close(self):
+        pass
+
+
+class FixtureStore(object):
+    '''
+    Responses stored on disk (index.json + bodies named by url hash), shared by browser clones
+    '''
+
+    def __init__(self, path, record):
+        self.path, self.record = path, record
+        self.lock = Lock()
+        self.requests = 0
+        self.index_path = os.path.join(path, 'index.json')
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                self.index = json.loads(f.read())
+        else:
+            self.index = {}
+
+    def get(self, url):
+        with self.lock:
+            self.requests += 1
+            entry = self.index.get(url, None)
+        if entry is None:
+            raise Exception('No fixture recorded for url: %s'%url)
+        with open(os.path.join(self.path, entry['file']), 'rb') as f:
+            return FixtureResponse(entry['url'], f.read(), entry['headers'])
+
+    def put(self, url, response):
+        data = response.read()
+        name = sha1(url.encode('utf-8')).hexdigest()
+        with self.lock:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            with open(os.path.join(self.path, name), 'wb') as f:
+                f.write(data)
+            headers = dict((k, v) for k, v in response.info().items())
+            self.index[url] = {'url': response.geturl(), 'file': name, 'headers': headers}
+            with open(self.index_path, 'wb') as f:
+                f.write(json.dumps(self.index, indent=2, sort_keys=True).encode('utf-8'))
+        return FixtureResponse(response.geturl(), data, headers)
+
+
+class FixtureBrowser(object):
+    '''
+    Browser replacement for plugin - records responses of real browser or replays them
+    '''
+
+    def __init__(self, store, browser=None):
+        self.store, self.browser = store, browser
+        self.addheaders = list(browser.addheaders) if browser is not None else []
+
+    def clone_browser(self):
+        return FixtureBrowser(self.store, self.browser.clone_browser() if self.browser is not None else None)
+
+    def set_header(self, *args):
+        if self.browser is not None:
+            self.browser.set_header(*args)
+
+    def set_simple_cookie(self, *args, **kwargs):
+        if self.browser is not None:
+            self.browser.set_simple_cookie(*args, **kwargs)
+
+    def open_novisit(self, url, timeout=30, **kwargs):
+        url = str(url)
+        if self.store.record:
+            with self.store.lock:
+                self.store.requests += 1
+            return self.store.put(url, self.browser.open_novisit(url, timeout=timeout))
+        return self.store.get(url)
+
+    open = open_novisit
+
+
+def load_cases(path):
+    with open(path, 'rb') as f:
+        return [json.loads(line) for line in f.read().decode('utf-8').splitlines() if line.strip()]
+
+def top_legie_id(plugin, results, title, authors, identifiers):
+    from calibre_plugins.legie.shared.compare import MetadataCompareContext, sort_candidates
+    ranked = sort_candidates(results, plugin, MetadataCompareContext(plugin, title, authors, dict(identifiers)))
+    for mi in ranked:
+        legie_id = mi.identifiers.get('legie', None) or mi.identifiers.get('legie_povidka', None)
+        if legie_id:
+            return legie_id.partition('#')[0]
+    return None
+
+def isolate_caches(plugin, path):
+    '''
+    Points persistent plugin caches (and in-memory caches of plugin) to empty directory
+    '''
+    from calibre_plugins.legie import cache, covers
+    os.makedirs(path, exist_ok=True)
+    with cache._cache_lock:
+        cache._cache = cache.PersistentCache(os.path.join(path, 'cache.sqlite'))
+    with covers._image_cache_lock:
+        covers._image_cache = None
+    with plugin.cache_lock:
+        plugin._isbn_to_identifier_cache = {}
+        plugin._identifier_to_cover_url_cache = {}
+
+def evaluate(plugin, cases, store, log):
+    plugin._browser = FixtureBrowser(store, plugin.browser if store.record else None)
+    base = tempfile.mkdtemp(prefix='legie_evaluate_')
+    try:
+        return evaluate_cases(plugin, cases, store, log, base)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+def evaluate_cases(plugin, cases, store, log, base):
+    rows = []
+    for number, case in enumerate(cases):
+        isolate_caches(plugin, os.path.join(base, str(number)))
+        if 'expected_cover' in case:
+            rows.append(evaluate_cover(plugin, case, store, log))
+            continue
+        title, authors = case.get('title', None), case.get('authors', None)
+        identifiers = case.get('identifiers', {}) or {}
+        expected = str(case['expected']).partition('#')[0]
+        requests_before = store.requests
+        rq = Queue()
+        start = time.time()
+        plugin.identify(log, rq, Event(), title=title, authors=list(authors) if authors else None,
+                        identifiers=dict(identifiers))
+        wall = time.time() - start
+        results = []
+        while True:
+            try:
+                results.append(rq.get_nowait())
+            except Empty:
+                break
+        found = top_legie_id(plugin, results, title, authors, identifiers)
+        rows.append((title, expected, found, found == expected, store.requests - requests_before, wall))
+    return rows
+
+def evaluate_cover(plugin, case, store, log):
+    requests_before = store.requests
+    start = time.time()
+    urls = plugin.resolve_cover_urls(log, dict(case.get('identifiers', {}) or {}))
+    wall = time.time() - start
+    found = urls[0] if urls else None
+    return (case.get('title', None), case['expected_cover'], found, found == case['expected_cover'],
+            store.requests - requests_before, wall)
+
+def report(rows):
+    print('%-40s %-10s %-10s %-3s %8s %8s'%('title', 'expected', 'top-1', 'ok', 'requests', 'time [s]'))
+    for title, expected, found, ok, requests, wall in rows:
+        print('%-40s %-10s %-10s %-3s %8d %8.2f'%((title or '')[:40], expected, found, 'x' if ok else '-', requests, wall))
+    if rows:
+        print('-' * 86)
+        print('top-1 accuracy: %.1f %% (%d/%d)'%(100.0 * sum(r[3] for r in rows) / len(rows), sum(r[3] for r in rows), len(rows)))
+        print('requests: %d total, %.1f per case'%(sum(r[4] for r in rows), float(sum(r[4] for r in rows)) / len(rows)))
+        print('wall time: %.2f s total, %.2f s per case'%(sum(r[5] for r in rows), sum(r[5] for r in rows) / len(rows)))
+
+
+if __name__ == '__main__':
+    import sys
+    from calibre.customize.ui import metadata_sources
+    from calibre.utils.logging import ThreadSafeLog
+
+    args = [a for a in sys.argv[1:] if a != '--record']
+    if len(args) < 2:
+        print('Usage: calibre-debug -e evaluate.py -- cases.jsonl fixtures_dir [--record]')
+        sys.exit(1)
+    plugin = [p for p in metadata_sources() if p.name == 'Legie'][0]
+    store = FixtureStore(args[1], record='--record' in sys.argv)
+    report(evaluate(plugin, load_cases(args[0]), store, ThreadSafeLog(level=ThreadSafeLog.WARN)))
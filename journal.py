@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+from hashlib import sha1
+from threading import local
+
+from .bulk import CachedResponse
+
+# book states in bulk identify job
+SEARCHED = 'searched'
+FETCHED = 'fetched'
+EMITTED = 'emitted'
+# unfinished jobs older than this are removed
+JOURNAL_TTL = 7 * 24 * 60 * 60
+
+
+def job_id(books):
+    '''
+    Job is identified by its books, the same bulk run started again resumes the journal
+    '''
+    data = [(title, authors, sorted((identifiers or {}).items())) for title, authors, identifiers in books]
+    return sha1(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class JobJournal(object):
+    '''
+    Persistent state of bulk identify job (SQLite in WAL mode) - state and found
+    candidates of every book and downloaded documents, so interrupted job
+    (network outage, calibre restart) continues without repeating finished requests
+    '''
+
+    def __init__(self, path, job):
+        self.path, self.job = path, job
+        self.local = local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS books (job TEXT NOT NULL, idx INTEGER NOT NULL, state TEXT NOT NULL, '
+                         'candidates TEXT, updated REAL NOT NULL, PRIMARY KEY (job, idx))')
+            conn.execute('CREATE TABLE IF NOT EXISTS documents (job TEXT NOT NULL, url TEXT NOT NULL, final_url TEXT NOT NULL, '
+                         'headers TEXT NOT NULL, data BLOB NOT NULL, updated REAL NOT NULL, PRIMARY KEY (job, url))')
+            conn.commit()
+            self.local.conn = conn
+        return conn
+
+    def states(self):
+        '''
+        Returns {book index: (state, candidates)}
+        '''
+        try:
+            rows = self.connection().execute('SELECT idx, state, candidates FROM books WHERE job=?', (self.job,)).fetchall()
+        except sqlite3.Error:
+            return {}
+        return dict((idx, (state, json.loads(candidates) if candidates else None)) for idx, state, candidates in rows)
+
+    def set_state(self, index, state, candidates=None):
+        try:
+            conn = self.connection()
+            with conn:
+                conn.execute('INSERT INTO books (job, idx, state, candidates, updated) VALUES (?, ?, ?, ?, ?) '
+                             'ON CONFLICT (job, idx) DO UPDATE SET state=excluded.state, '
+                             'candidates=COALESCE(excluded.candidates, books.candidates), updated=excluded.updated',
+                             (self.job, index, state, json.dumps(candidates) if candidates is not None else None, time.time()))
+        except sqlite3.Error:
+            pass
+
+    def document(self, url):
+        '''
+        Returns (final url, data, headers) of document downloaded by this job or None
+        '''
+        try:
+            row = self.connection().execute('SELECT final_url, data, headers FROM documents WHERE job=? AND url=?',
+                                            (self.job, url)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return row[0], zlib.decompress(row[1]), json.loads(row[2])
+
+    def store_document(self, url, final_url, data, headers):
+        try:
+            conn = self.connection()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO documents (job, url, final_url, headers, data, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                             (self.job, url, final_url, json.dumps(headers), zlib.compress(data), time.time()))
+        except sqlite3.Error:
+            pass
+
+    def finish(self):
+        '''
+        Removes finished job
+        '''
+        self.remove(self.job)
+
+    def remove(self, job):
+        try:
+            conn = self.connection()
+            with conn:
+                conn.execute('DELETE FROM books WHERE job=?', (job,))
+                conn.execute('DELETE FROM documents WHERE job=?', (job,))
+        except sqlite3.Error:
+            pass
+
+    def prune(self):
+        '''
+        Removes jobs not continued for JOURNAL_TTL
+        '''
+        limit = time.time() - JOURNAL_TTL
+        try:
+            conn = self.connection()
+            with conn:
+                old = [r[0] for r in conn.execute('SELECT job FROM books GROUP BY job HAVING MAX(updated)<?', (limit,))]
+                for job in old:
+                    conn.execute('DELETE FROM books WHERE job=?', (job,))
+                    conn.execute('DELETE FROM documents WHERE job=?', (job,))
+                conn.execute('DELETE FROM documents WHERE updated<? AND job NOT IN (SELECT job FROM books)', (limit,))
+        except sqlite3.Error:
+            pass
+
+
+class JournalBrowser(object):
+    '''
+    Browser wrapper storing downloaded documents into job journal,
+    documents already downloaded by interrupted run are not downloaded again
+    '''
+
+    def __init__(self, browser, journal):
+        self.browser, self.journal = browser, journal
+        self.addheaders = browser.addheaders
+
+    def clone_browser(self):
+        return JournalBrowser(self.browser.clone_browser(), self.journal)
+
+    def set_header(self, *args):
+        self.browser.set_header(*args)
+
+    def set_simple_cookie(self, *args, **kwargs):
+        self.browser.set_simple_cookie(*args, **kwargs)
+
+    def open_novisit(self, url, timeout=30, **kwargs):
+        url = str(url)
+        entry = self.journal.document(url)
+        if entry is not None:
+            return CachedResponse(*entry)
+        response = self.browser.open_novisit(url, timeout=timeout, **kwargs)
+        data = response.read()
+        headers = dict((k, v) for k, v in response.info().items())
+        self.journal.store_document(url, response.geturl(), data, headers)
+        return CachedResponse(response.geturl(), data, headers)
+
+    open = open_novisit
+
+
+def open_journal(books):
+    '''
+    Returns journal of bulk job in calibre cache directory
+    '''
+    from calibre.constants import cache_dir
+    base = os.path.join(cache_dir(), 'legie')
+    os.makedirs(base, exist_ok=True)
+    journal = JobJournal(os.path.join(base, 'journal.sqlite'), job_id(books))
+    journal.prune()
+    return journal
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+import json
+import time
+from threading import Lock, Event
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib2 import quote
+
+from .shared.utils import load_url
+from .cache import get_cache, OBALKYKNIH
+
+API_URL = 'https://cache.obalkyknih.cz/api/books?multi=%s'
+VIEW_URL = 'https://www.obalkyknih.cz/view?isbn=%s'
+# API limit of books in one request
+BATCH_SIZE = 50
+# time for collecting codes from other workers before request is sent
+BATCH_WINDOW = 0.05
+
+
+def normalize_code(code):
+    '''
+    ISBN-10 is converted into EAN-13 (same form as returned by obalkyknih API)
+    '''
+    code = code.replace('-', '').replace(' ', '').upper()
+    if len(code) == 10:
+        body = '978' + code[:9]
+        check = (10 - sum(int(c) * (1 if i % 2 == 0 else 3) for i, c in enumerate(body)) % 10) % 10
+        return body + str(check)
+    return code
+
+
+class Batch(object):
+    '''
+    Codes resolved by one API request, results are kept only until waiting workers read them
+    '''
+
+    def __init__(self):
+        self.codes = set()
+        self.event = Event()
+        # normalized code -> cover url, '' (no cover) or None (failed request)
+        self.results = {}
+
+
+class ObalkyResolver(object):
+    '''
+    Resolves cover urls for ISBN/EAN codes on obalkyknih.cz. Codes requested by workers
+    at the same time are sent in one multi-book API request, results (negative too)
+    are stored in plugin cache. HTML view page is used when API request fails.
+    '''
+
+    def __init__(self):
+        self.lock = Lock()
+        # batch collecting codes for next request
+        self.batch = Batch()
+        # normalized code -> batch of request in progress
+        self.inflight = {}
+        self.leader = False
+
+    def cover_url(self, log, browser, codes):
+        '''
+        Returns cover url for first code (e.g. ISBN, then EAN) with cover found
+        '''
+        codes = [c for c in codes if c]
+        if not codes:
+            return None
+        found = self.resolve(log, browser, codes)
+        for code in codes:
+            url = found.get(normalize_code(code), None)
+            if url:
+                return url
+        return None
+
+    def resolve(self, log, browser, codes):
+        '''
+        Returns {normalized code: cover url or None}
+        '''
+        cache = get_cache()
+        found, waiting = {}, []
+        lead = False
+        with self.lock:
+            for code in set(normalize_code(c) for c in codes):
+                cached = cache.get(OBALKYKNIH, code)
+                if cached is not None:
+                    found[code] = cached or None
+                    continue
+                # code already sent by leader waits for its request
+                batch = self.inflight.get(code, None)
+                if batch is None:
+                    batch = self.batch
+                    batch.codes.add(code)
+                waiting.append((code, batch))
+            if self.batch.codes and not self.leader:
+                self.leader = lead = True
+
+        if lead:
+            # wait for codes from other workers and resolve whole batch
+            time.sleep(BATCH_WINDOW)
+            with self.lock:
+                batch, self.batch = self.batch, Batch()
+                self.leader = False
+                for code in batch.codes:
+                    self.inflight[code] = batch
+            try:
+                self.fetch(log, browser, list(batch.codes), batch.results)
+            finally:
+                with self.lock:
+                    for code in batch.codes:
+                        if self.inflight.get(code, None) is batch:
+                            del self.inflight[code]
+                batch.event.set()
+
+        for code, batch in waiting:
+            batch.event.wait(60)
+            found[code] = batch.results.get(code, None) or None
+        return found
+
+    def fetch(self, log, browser, codes, results):
+        cache = get_cache()
+        br = browser.clone_browser()
+        for start in range(0, len(codes), BATCH_SIZE):
+            chunk = codes[start:start+BATCH_SIZE]
+            query = API_URL%quote(json.dumps([{'isbn': c} for c in chunk]))
+            try:
+                log.info('Get obalkyknih covers for: %s'%chunk)
+                books = json.loads(br.open_novisit(query, timeout=30).read())
+            except Exception as e:
+                log.error('Obalkyknih API problem: %s - using view pages'%e)
+                for code in chunk:
+                    self.store(cache, results, code, self.fetch_view(log, br, code))
+                continue
+            urls = dict((c, None) for c in chunk)
+            for book in books if isinstance(books, list) else []:
+                code = normalize_code(str(book.get('ean', None) or book.get('isbn', None) or ''))
+                url = book.get('cover_preview510_url', None) or book.get('cover_medium_url', None)
+                if code in urls and url:
+                    urls[code] = url
+            for code, url in urls.items():
+                self.store(cache, results, code, url)
+
+    def fetch_view(self, log, br, code):
+        url_obalky = VIEW_URL%code
+        try:
+            log.info('Get obalkyknih page:%s'%url_obalky)
+            root, _ = load_url(log, url_obalky, br)
+        except Exception as e:
+            log.error('Load url problem: %r - %s' % (url_obalky, e))
+            return None
+        cover_url = root.xpath('//a[@data-lightbox="book-cover"]/@href')
+        return cover_url[0].strip() if cover_url else ''
+
+    def store(self, cache, results, code, url):
+        # '' is negative result, None is failed request (not cached)
+        results[code] = url
+        if url is not None:
+            cache.set(OBALKYKNIH, code, url)
+
+resolver = ObalkyResolver()
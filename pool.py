@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+from heapq import heappush, heappop
+from itertools import count
+from threading import Lock, Condition, Thread
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class ConcurrencyTuner(object):
+    '''
+    Additive increase / multiplicative decrease of worker concurrency
+    driven by exponentially weighted average of single HTTP request latency
+    (observed by SharedBrowser), so books with more subpages do not look slow.
+    Shared by all identify runs in calibre process.
+    '''
+    ALPHA = 0.3
+    SLOWDOWN = 2.0
+
+    def __init__(self, initial=3):
+        self.lock = Lock()
+        self.limit = float(initial)
+        self.ewma = None
+
+    def observe(self, latency):
+        with self.lock:
+            if self.ewma is not None and latency > self.SLOWDOWN * self.ewma:
+                # server is getting slower, back off
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit += 1.0 / self.limit
+            self.ewma = latency if self.ewma is None else self.ALPHA * latency + (1 - self.ALPHA) * self.ewma
+
+    def current(self, maximum):
+        with self.lock:
+            self.limit = min(self.limit, float(maximum))
+            return max(1, min(int(self.limit), maximum))
+
+tuner = ConcurrencyTuner()
+
+
+class ConfidenceQueue(object):
+    '''
+    Result queue wrapper, sets cancel event once any result reaches confidence threshold
+    '''
+
+    def __init__(self, queue, confidence, threshold, cancel, log):
+        self.queue, self.confidence, self.threshold = queue, confidence, threshold
+        self.cancel, self.log = cancel, log
+
+    def put(self, mi):
+        self.queue.put(mi)
+        if self.cancel.is_set():
+            return
+        try:
+            score = self.confidence(mi)
+        except:
+            self.log.exception('Error computing match confidence')
+            return
+        if score >= self.threshold:
+            self.log.info('High confidence match found (%s), cancelling remaining workers'%score)
+            self.cancel.set()
+
+
+class TaskScheduler(object):
+    '''
+    Bounded scheduler shared by all books of identify run. Tasks are run by priority
+    (lower first, e.g. workers of already searched books before searches of next books),
+    tasks can submit other tasks. Number of running tasks follows concurrency tuner.
+    '''
+
+    def __init__(self, log, abort, max_workers):
+        self.log, self.abort = log, abort
+        self.max_workers = max(1, max_workers)
+        self.condition = Condition()
+        self.tasks = []
+        self.counter = count()
+        self.running = 0
+
+    def submit(self, priority, func, *args):
+        with self.condition:
+            heappush(self.tasks, (priority, next(self.counter), func, args))
+            self.condition.notify()
+
+    def run(self):
+        '''
+        Runs until all tasks (including submitted by other tasks) are finished or abort is set
+        '''
+        threads = [Thread(target=self._loop) for i in range(self.max_workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        with self.condition:
+            while (self.tasks or self.running) and not self.abort.is_set():
+                self.condition.wait(0.2)
+            if self.abort.is_set():
+                self.log.info('Abort is set to true, %s tasks will not be started'%len(self.tasks))
+                self.tasks = []
+            self.condition.notify_all()
+        # do not block identify on abort, running tasks finish in background
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while not self.abort.is_set() and \
+                        (not self.tasks or self.running >= tuner.current(self.max_workers)):
+                    if not self.tasks and not self.running:
+                        return
+                    self.condition.wait(0.2)
+                if self.abort.is_set():
+                    return
+                priority, _, func, args = heappop(self.tasks)
+                self.running += 1
+            try:
+                func(*args)
+            except:
+                self.log.exception('Error in scheduled task')
+            finally:
+                with self.condition:
+                    self.running -= 1
+                    self.condition.notify_all()
+
+
+def run_worker(worker, finished=None):
+    '''
+    Runs Worker (it catches and logs its own exceptions)
+    '''
+    try:
+        worker.run()
+    finally:
+        if finished is not None:
+            finished()
+
+
+# threads of pool shared by all cover downloads in calibre process
+SHARED_POOL_WORKERS = 10
+_executor = None
+_executor_lock = Lock()
+
+def shared_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SHARED_POOL_WORKERS, thread_name_prefix='legie')
+        return _executor
+
+
+def map_ordered(func, items, max_workers, abort):
+    '''
+    Runs func for all items on shared thread pool (at most max_workers items
+    of this call at once), returns results in items order
+    (None for items not finished before abort)
+    '''
+    items = list(items)
+    if not items:
+        return []
+    results = [None] * len(items)
+    executor = shared_executor()
+    pending = iter(enumerate(items))
+    futures = {}
+
+    def submit_next():
+        for i, item in pending:
+            future = executor.submit(func, item)
+            futures[future] = i
+            return future
+        return None
+
+    running = set(f for f in (submit_next() for _ in range(max(1, max_workers))) if f is not None)
+    while running and not abort.is_set():
+        done, running = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+        for f in done:
+            results[futures[f]] = f.result()
+            following = submit_next()
+            if following is not None:
+                running.add(following)
+    for f in running:
+        # not started tasks of aborted call
+        f.cancel()
+    return results
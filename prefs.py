@@ -8,6 +8,9 @@ __copyright__ = '2024 seeder'
 __docformat__ = 'restructuredtext en'
 
 import copy
+import json
+from hashlib import sha1
+from types import MappingProxyType
 from calibre_plugins.legie.shared.prefs import PluginPrefsName, MetadataIdentifier, MetadataName
 from calibre.utils.config import JSONConfig
 
@@ -16,6 +19,13 @@ try:
 except NameError:
     pass # load_translations() added in calibre 1.9
 
+class LegiePrefsName:
+    '''
+    Legie only preferences (not shared with other plugins)
+    '''
+    MAX_WORKERS = 'maxWorkers'
+    CONFIDENCE_THRESHOLD = 'confidenceThreshold'
+
 LINE_OPTIONS = [
         (MetadataIdentifier.CUSTOM_TEXT, True, MetadataName.CUSTOM_TEXT),
         (MetadataIdentifier.TITLE, True, MetadataName.TITLE),
@@ -239,6 +249,8 @@ DEFAULT_CATEGORY_MAPPINGS = {
 
 DEFAULT_STORE_VALUES = {
     PluginPrefsName.KEY_MAX_DOWNLOADS: 10,
+    LegiePrefsName.MAX_WORKERS: 4,
+    LegiePrefsName.CONFIDENCE_THRESHOLD: 100,
     PluginPrefsName.MAX_COVERS: 1,
     PluginPrefsName.OBALKYKNIH_COVER: False,
     PluginPrefsName.IDENTIFIER_SEARCH: True,
@@ -282,6 +294,19 @@ DEFAULT_STORE_VALUES = {
     PluginPrefsName.KEY_PUBLISHER_MAPPINGS: {}
 }
 
+# Raised on every set_pref, compiled lookup tables are valid only for one version
+prefs_version = 0
+# key -> (prefs_version, compiled value), e.g. option -> {casefolded key: mapped values}
+_compiled_mappings = {}
+# (prefs_version, PrefsSnapshot) - snapshot is immutable, shared until preferences change
+_snapshot = None
+
+def compile_mapping(mappings):
+    '''
+    Returns lookup table with casefolded keys, so remapping is single dict hit
+    '''
+    return dict((k.casefold(), v) for (k, v) in mappings.items())
+
 # This is where all preferences for this plugin will be stored
 plugin_prefs = JSONConfig('plugins/legie')
 # Set defaults
@@ -296,4 +321,67 @@ def get_pref(option=None):
         return plugin_prefs
 
 def set_pref(new_prefs):
-    plugin_prefs[PluginPrefsName.STORE_NAME] = new_prefs
\ No newline at end of file
+    global prefs_version
+    plugin_prefs[PluginPrefsName.STORE_NAME] = new_prefs
+    # invalidate lookup tables compiled from previous preferences
+    prefs_version += 1
+    _compiled_mappings.clear()
+
+def get_snapshot():
+    '''
+    Returns preferences snapshot of current preferences version (copied only once per version)
+    '''
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or snapshot[0] != prefs_version:
+        value = PrefsSnapshot()
+        snapshot = _snapshot = (value.version, value)
+    return snapshot[1]
+
+class PrefsSnapshot(object):
+    '''
+    Read-only copy of plugin preferences taken once (e.g. at start of identify)
+    and shared by all workers, so the whole run uses consistent configuration
+    without repeated JSONConfig lookups
+    '''
+    __slots__ = ('_values', 'version')
+
+    def __init__(self):
+        object.__setattr__(self, 'version', prefs_version)
+        c = plugin_prefs[PluginPrefsName.STORE_NAME]
+        defaults = plugin_prefs.defaults[PluginPrefsName.STORE_NAME]
+        values = dict((option, copy.deepcopy(c.get(option, default_value)))
+                      for option, default_value in defaults.items())
+        object.__setattr__(self, '_values', MappingProxyType(values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Preferences snapshot is read-only')
+
+    def get(self, option):
+        return self._values[option]
+
+    def fingerprint(self):
+        '''
+        Returns hash of all preferences (stable across calibre restarts)
+        '''
+        return self.compiled('fingerprint', lambda prefs: sha1(json.dumps(dict(prefs._values), sort_keys=True,
+                                                                          default=str).encode('utf-8')).hexdigest())
+
+    def mapping(self, option):
+        '''
+        Returns casefolded lookup table for mapping option (series, publisher, category),
+        compiled only once per preferences version
+        '''
+        return self.compiled(option, lambda prefs: compile_mapping(prefs.get(option)))
+
+    def compiled(self, key, factory):
+        '''
+        Returns factory(self) cached for current preferences version
+        '''
+        compiled = _compiled_mappings.get(key, None)
+        if compiled is not None and compiled[0] == self.version:
+            return compiled[1]
+        value = factory(self)
+        if self.version == prefs_version:
+            _compiled_mappings[key] = (self.version, value)
+        return value
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+from hashlib import sha1
+from threading import Lock
+
+# parts of book page read by Worker (title, info, ratings, tags, annotation, authors, covers, tabs)
+PAGE_FINGERPRINT_XPATH = ('//h2[@itemprop="name" or @id="nazev_povidky"] | //h3[@id="podtitul_knihy"] | '
+                          '//div[@id="kniha_info"] | //div[@id="povidka_info"] | //p[@id="jine_nazvy"] | '
+                          '//span[@itemprop="ratingValue" or @itemprop="ratingCount"] | //a[contains(@href, "tagy/")] | '
+                          '//div[@id="anotace"] | //div[@id="pro_obal"]/.. | //img[@class="obalk"]/@src | '
+                          '//div[@data-kasp-id]/@data-kasp-id | //ul[@id="zalozky"]')
+# issues list (/vydani)
+ISSUES_FINGERPRINT_XPATH = '//div[@id="vycet_vydani"]'
+# awards (/oceneni) - award headings with their categories
+AWARDS_FINGERPRINT_XPATH = '//div[h3/a[contains(@href, "oceneni/")]]'
+# tales in book (/povidky)
+TALES_FINGERPRINT_XPATH = '//dl/dt/a[contains(@href, "povidka/")]'
+# subpages downloaded by Worker (tabs of book page)
+SUBPAGES = (
+    ('/oceneni', AWARDS_FINGERPRINT_XPATH, '//ul[@id="zalozky"]/li/a[contains(text(), "ocenění")]'),
+    ('/povidky', TALES_FINGERPRINT_XPATH, '//ul[@id="zalozky"]/li/a[contains(text(), "povídky")]'),
+)
+
+
+def page_fingerprint(root, xpath):
+    '''
+    Returns hash of text in parsed parts of page, whitespace and other
+    parts of page (ads, visitor counters) do not change it
+    '''
+    parts = []
+    for node in root.xpath(xpath):
+        text = node if isinstance(node, str) else node.text_content()
+        parts.append(' '.join(text.split()))
+    if not parts:
+        # unknown page layout - whole page text
+        parts.append(' '.join(root.text_content().split()))
+    return sha1('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+
+def subpages(url, root):
+    '''
+    Returns [(url, fingerprint xpath)] of subpages Worker downloads for book page
+    '''
+    pages = []
+    if '/povidka/' not in url:
+        pages.append(('%s/vydani'%url, ISSUES_FINGERPRINT_XPATH))
+    for suffix, xpath, tab in SUBPAGES:
+        if root.xpath(tab):
+            pages.append((url + suffix, xpath))
+    return pages
+
+def subpage_xpath(url):
+    if url.endswith('/vydani'):
+        return ISSUES_FINGERPRINT_XPATH
+    for suffix, xpath, tab in SUBPAGES:
+        if url.endswith(suffix):
+            return xpath
+    return PAGE_FINGERPRINT_XPATH
+
+def header(headers, name):
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class RefreshStats(object):
+    '''
+    Counts of books in incremental refresh
+    '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.unchanged = self.changed = self.failed = 0
+
+    def add(self, state):
+        with self.lock:
+            setattr(self, state, getattr(self, state) + 1)
+
+    def as_dict(self):
+        with self.lock:
+            return {'unchanged': self.unchanged, 'changed': self.changed, 'failed': self.failed}
+
+    def __str__(self):
+        return 'unchanged: %(unchanged)s, changed: %(changed)s, failed: %(failed)s'%self.as_dict()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# vim:fileencoding=UTF-8:ts=4:sw=4:sta:et:sts=4:ai
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+
+__license__   = 'GPL v3'
+__copyright__ = '2024 seeder'
+__docformat__ = 'restructuredtext en'
+
+import re
+from threading import Lock
+
+from .shared.utils import load_url, strip_accents_cached
+from .cache import get_cache, SERIES
+
+BOOK_ID_REGEX = re.compile(r'kniha/(\d+)')
+INDEX_REGEX = re.compile(r'(\d+(?:[.,]\d+)?)')
+
+
+def normalize_title(title):
+    return ' '.join(strip_accents_cached(title).lower().replace('-', ' ').split()) if title else ''
+
+def surnames(authors):
+    return set(strip_accents_cached(a.split(' ')[-1]).lower() for a in authors or [] if a and a.strip())
+
+def parse_series_volumes(root):
+    '''
+    Returns [[legie id, title, series index]] of volumes listed on series page
+    '''
+    volumes = []
+    seen = set()
+    for row in root.xpath('//table//tr[td/a[contains(@href, "kniha/")]]'):
+        link = row.xpath('td/a[contains(@href, "kniha/")]')[0]
+        found = BOOK_ID_REGEX.search(link.get('href', ''))
+        title = (link.text_content() or '').strip()
+        if found is None or not title or found.group(1) in seen:
+            continue
+        seen.add(found.group(1))
+        # first cell holds volume number (e.g. '3.'), volumes without it are not matched
+        index = INDEX_REGEX.search(' '.join(row.xpath('td[1]//text()')))
+        if index is None:
+            continue
+        volumes.append([found.group(1), title, float(index.group(1).replace(',', '.'))])
+    return volumes
+
+
+class SeriesResolver(object):
+    '''
+    Volumes of series found by workers of bulk identify (legie series page is downloaded
+    once, volume list is kept in plugin cache). Books of the job matching a volume
+    by title, author surname (of books in the series) and series index (when known)
+    skip the search cascade.
+    '''
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.lock = Lock()
+        self.series = set()
+        # series url -> author surnames of found books in the series
+        self.authors = {}
+        # normalized title -> [(legie id, series index, series url)]
+        self.titles = {}
+
+    def add_series(self, log, browser, url, authors, timeout=30):
+        with self.lock:
+            self.authors.setdefault(url, set()).update(surnames(authors))
+            if url in self.series:
+                return
+            self.series.add(url)
+        cache = get_cache()
+        volumes = cache.get(SERIES, url)
+        if volumes is None:
+            try:
+                root, _ = load_url(log, url, browser, timeout=timeout)
+                volumes = parse_series_volumes(root)
+            except:
+                log.exception('*** Failed to load series page: %s'%url)
+                return
+            cache.set(SERIES, url, volumes)
+        log.info('Series %s: %s volumes'%(url, len(volumes)))
+        with self.lock:
+            for legie_id, title, index in volumes:
+                self.titles.setdefault(normalize_title(title), []).append((legie_id, index, url))
+
+    def match(self, title, authors, series_index=None):
+        '''
+        Returns book url of volume with title, author (and series index) or None when not unique
+        '''
+        wanted = surnames(authors)
+        if not wanted:
+            return None
+        with self.lock:
+            found = list(set((legie_id, index) for legie_id, index, url in self.titles.get(normalize_title(title), [])
+                             if self.authors.get(url, set()) & wanted))
+        if series_index is not None:
+            try:
+                series_index = float(series_index)
+            except (TypeError, ValueError):
+                return None
+            found = [f for f in found if f[1] == series_index]
+        if len(found) != 1:
+            return None
+        return ''.join([self.base_url, '/kniha/', found[0][0]])
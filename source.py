@@ -8,10 +8,110 @@ __copyright__ = '2024 seeder'
 __docformat__ = 'restructuredtext en'
 
 import re
+from functools import lru_cache
 from calibre.ebooks.metadata import check_isbn
 from calibre.ebooks.metadata.sources.base import Source as BaseSource
 from .prefs import PluginPrefsName
-from .utils import strip_accents
+from .utils import strip_accents, strip_accents_cached
+
+# keyword:value metadata in title (compiled once)
+TITLE_METADATA_REGEX = re.compile(r"(?:(?:"
+                                  r"isbn|ean|oclc|"
+                                  r"dbk|dbknih|databazeknih|"
+                                  r"dbkp|dbk_povidka|databazeknih_povidka|dbknih_povidka|"
+                                  r"xtrance_id|xtrance|xtr|"
+                                  r"legie|legie_povidka|"
+                                  r"pitaval|pitaval_povidka|"
+                                  r"publisher|pubdate|pubyear|language|lang|"
+                                  r"type|search"
+                                  r"):(?:\S*)(?: |$))")
+# (identifier, aliases) - last alias found wins
+IDENTIFIERS_ALIASES = (
+    ('databazeknih', ('databazeknih', 'dbknih', 'dbk')),
+    ('databazeknih_povidka', ('databazeknih_povidka', 'dbknih_povidka', 'dbk_povidka', 'dbk_p', 'dbkp')),
+    ('legie', ('legie',)),
+    ('legie_povidka', ('legie_povidka',)),
+    ('pitaval', ('pitaval',)),
+    ('pitaval_povidka', ('pitaval_povidka',)),
+    ('xtrance', ('xtrance', 'xtrance_id', 'xtr')),
+    ('isbn', ('isbn', 'ean')),
+    ('pubdate', ('pubdate', 'pubyear')),
+    ('publisher', ('publisher',)),
+    ('language', ('language', 'lang')),
+    ('type', ('type',)),
+    ('search', ('search',)),
+)
+BOOK_TYPES = (
+    (frozenset(('audio', 'audiokniha', 'audiobook')), 'a'),
+    (frozenset(('povidka', 'basen', 'cast_dila', 'part', 'book_part', 'tale', 'poem')), 'p'),
+)
+SEARCH_ENGINES = (
+    (frozenset(('google',)), 'g'),
+    (frozenset(('duckduckgo', 'ddg', 'duck')), 'd'),
+)
+NON_ISBN_CHARS = re.compile(r'[^0-9X]')
+
+def _normalize_choice(value, choices):
+    value = strip_accents(value).lower()
+    for names, short in choices:
+        if value in names:
+            return short
+    return None
+
+def _split_year(identifiers, key):
+    # legie/pitaval id with published year suffix (e.g. legie:103#1996)
+    if identifiers.get(key, None) and '#' in identifiers[key]:
+        if not identifiers.get('pubdate', None):
+            year = identifiers[key].split('#')[1]
+            if year.isdigit() and len(year) == 4:
+                identifiers['pubdate'] = year
+        identifiers[key] = identifiers[key].split('#')[0]
+
+@lru_cache(maxsize=1024)
+def _parse_title_metadata(title, identifiers_items):
+    '''
+    Returns (cleaned title, identifiers) for title with metadata in keyword:value format,
+    memoised for (title, identifiers)
+    '''
+    identifiers = dict(identifiers_items)
+    # one pass over title - collect metadata and keep the rest of title
+    parts, last = [], 0
+    for match in TITLE_METADATA_REGEX.finditer(title):
+        parts.append(title[last:match.start()])
+        last = match.end()
+        key, value = match.group(0).rstrip(' ').split(':', 1)
+        identifiers[key] = value
+    parts.append(title[last:])
+    title = ' '.join(''.join(parts).split())
+
+    for identifier, keys in IDENTIFIERS_ALIASES:
+        for key in keys:
+            value = identifiers.get(key, None)
+            if value is not None:
+                identifiers[identifier] = value
+
+    # check for type audiobook/tale
+    book_type = identifiers.get('type', None)
+    if book_type:
+        identifiers['type'] = _normalize_choice(book_type, BOOK_TYPES) or book_type
+
+    # check for search engine
+    search_engine = identifiers.get('search', None)
+    if search_engine:
+        identifiers['search'] = _normalize_choice(search_engine, SEARCH_ENGINES) or search_engine
+
+    # find ISBN in title and pass it into identifiers
+    # (only words with enough digits can be ISBN)
+    for t in title.split():
+        if len(NON_ISBN_CHARS.sub('', t.upper())) in (10, 13) and check_isbn(t) is not None:
+            identifiers['isbn'] = t
+            title = title.replace(t, '')
+            break
+
+    _split_year(identifiers, 'legie')
+    _split_year(identifiers, 'pitaval')
+    return title, identifiers
+
 
 class Source(BaseSource):
     version                 = (0, 0, 0)
@@ -29,83 +129,13 @@ class Source(BaseSource):
     def search_title_for_metadata(title, identifiers):
         if not title:
             return title, identifiers
-        search_regex = re.compile(r"(?:(?:"
-                                  r"isbn|ean|oclc|"
-                                  r"dbk|dbknih|databazeknih|"
-                                  r"dbkp|dbk_povidka|databazeknih_povidka|dbknih_povidka|"
-                                  r"xtrance_id|xtrance|xtr|"
-                                  r"legie|legie_povidka|"
-                                  r"pitaval|pitaval_povidka|"
-                                  r"publisher|pubdate|pubyear|language|lang|"
-                                  r"type|search"
-                                  r"):(?:\S*)(?: |$))")
-        meta_title = re.findall(search_regex, title)
-        # Remove matched metadata from title
-        title = re.sub(pattern=search_regex, string=title, repl='')
-        title = ' '.join(title.split())
-
-        identifiers.update(dict([i.rstrip(' ').split(':', 1) for i in meta_title]))
-
-        identifiers_mapping = {
-            'databazeknih': ['databazeknih', 'dbknih', 'dbk'],
-            'databazeknih_povidka': ['databazeknih_povidka', 'dbknih_povidka', 'dbk_povidka', 'dbk_p', 'dbkp'],
-            'legie': ['legie'],
-            'legie_povidka': ['legie_povidka'],
-            'pitaval': ['pitaval'],
-            'pitaval_povidka': ['pitaval_povidka'],
-            'xtrance': ['xtrance', 'xtrance_id', 'xtr'],
-            'isbn': ['isbn', 'ean'],
-            'pubdate': ['pubdate', 'pubyear'],
-            'publisher': ['publisher'],
-            'language': ['language', 'lang'],
-            'type': ['type'],
-            'search': ['search'],
-        }
-        for identifier, keys in identifiers_mapping.items():
-            for key in keys:
-                value = identifiers.get(key, None)
-                if value is not None:
-                    identifiers[identifier] = value
-
-        # check for type audiobook/tale
-        book_type = identifiers.get('type', None)
-        if book_type:
-            if strip_accents(book_type).lower() in ['audio', 'audiokniha', 'audiobook']:
-                identifiers['type'] = 'a'
-            elif strip_accents(book_type).lower() in ['povidka', 'basen', 'cast_dila', 'part', 'book_part', 'tale', 'poem']:
-                identifiers['type'] = 'p'
-
-        # check for search engine
-        search_engine = identifiers.get('search', None)
-        if search_engine:
-            if strip_accents(search_engine).lower() in ['google']:
-                identifiers['search'] = 'g'
-            elif strip_accents(search_engine).lower() in ['duckduckgo', 'ddg', 'duck']:
-                identifiers['search'] = 'd'
-
-        # find ISBN in title and pass it into identifiers
-        title_list = title.split()
-        title_isbn = [t for t in title_list if check_isbn(t) is not None]
-        if title_isbn:
-            identifiers['isbn'] = title_isbn[0]
-            title = title.replace(title_isbn[0], '')
-
-        if identifiers.get('legie', None) and \
-            '#' in identifiers['legie']:
-            if not identifiers.get('pubdate', None):
-                year = identifiers['legie'].split('#')[1]
-                if year.isdigit() and len(year) == 4:
-                    identifiers['pubdate'] = year
-            identifiers['legie'] = identifiers['legie'].split('#')[0]
-
-        if identifiers.get('pitaval', None) and \
-            '#' in identifiers['pitaval']:
-            if not identifiers.get('pubdate', None):
-                year = identifiers['pitaval'].split('#')[1]
-                if year.isdigit() and len(year) == 4:
-                    identifiers['pubdate'] = year
-            identifiers['pitaval'] = identifiers['pitaval'].split('#')[0]
-
+        try:
+            title, found = _parse_title_metadata(title, frozenset(identifiers.items()))
+        except TypeError:
+            # unhashable identifier value - parse without memo
+            title, found = _parse_title_metadata.__wrapped__(title, list(identifiers.items()))
+        # passed identifiers are updated in place as before
+        identifiers.update(found)
         return title, identifiers
 
     def _parse_duckduckgo_results(self, log, orig_title, orig_authors, root, matches, no_matches, timeout):
@@ -144,7 +174,7 @@ class Source(BaseSource):
                 found_auths_ova = {'%sová' %a for a in found_auths} #added 'ová'
                 found_auths = found_auths.union(found_auths_ova)
                 #hledá shodu v příjmení i jménu
-                log.debug('Orig_strip: %s .. title_strip: %s'%(strip_accents(orig_title).lower().replace('-', ''), strip_accents(title).lower().replace('-', '')))
+                log.debug('Orig_strip: %s .. title_strip: %s'%(strip_accents_cached(orig_title).lower().replace('-', ''), strip_accents_cached(title).lower().replace('-', '')))
                 if orig_authors:
                     orig_authors = ' '.join(orig_authors).split()
                     orig_auths = {o.lower().replace(',', '') for o in orig_authors}
@@ -153,7 +183,7 @@ class Source(BaseSource):
                     log.info('found_auths: %s .. orig_auths: %s'%(found_auths, orig_auths))
                 #pokud je zadán pouze název
                 if not vlozit and orig_title and \
-                strip_accents(orig_title).lower().replace('-', '') in strip_accents(title).lower().replace('-', ''):
+                strip_accents_cached(orig_title).lower().replace('-', '') in strip_accents_cached(title).lower().replace('-', ''):
                     vlozit = True
 
             if vlozit and result_url not in matches and len(matches) < max_results:
@@ -216,7 +246,7 @@ class Source(BaseSource):
                     log.info('found_auths: %s .. orig_auths: %s'%(found_auths, orig_auths))
                 #pokud je zadán pouze název
                 if not vlozit and orig_title and \
-                strip_accents(orig_title).lower().replace('-', '') in strip_accents(title).lower().replace('-', ''):
+                strip_accents_cached(orig_title).lower().replace('-', '') in strip_accents_cached(title).lower().replace('-', ''):
                     vlozit = True
 
             if vlozit and result_url not in matches and len(matches) < max_results:
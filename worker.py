@@ -15,24 +15,89 @@ import re
 from calibre.utils.date import utc_tz
 from lxml.html import tostring
 
-from .shared.utils import load_url, strip_accents
+from .shared.utils import load_url, strip_accents_cached
 from .shared.prefs import PluginPrefsName, MetadataIdentifier
-from .prefs import get_pref
+from .prefs import get_snapshot
+from .builder import get_builders
+
+# (field, match(cell, first_text)) - labels of cells in issue 'data_vydani' table
+# first cell matching the label wins, same as previous per field xpath queries
+ISSUE_TABLE_LABELS = (
+    ('dimensions', lambda cell, text: 'rozměry' in text),
+    ('print_run', lambda cell, text: 'výtisků' in text),
+    ('issue_number', lambda cell, text: text.startswith(' vydání')),
+    ('price', lambda cell, text: 'cena' in text),
+    ('note', lambda cell, text: cell.get('colspan') == '2' and 'poznámka:' in text),
+    ('cover_type', lambda cell, text: 'vazba:' in text),
+    ('pages', lambda cell, text: 'počet' in text and 'stran' in text),
+    ('pubdate', lambda cell, text: 'přibližné' in text),
+    ('languages', lambda cell, text: 'jazyk' in text),
+    ('translators', lambda cell, text: 'překlad:' in text),
+    ('illustrators', lambda cell, text: 'ilustrací:' in text),
+    ('cover_authors', lambda cell, text: 'obálky:' in text),
+)
+
+class IssueRecord(object):
+    '''
+    Issue specific details of one book issue, book level details (title, comments,
+    category, ...) are not copied but read from shared book Metadata object
+    '''
+    __slots__ = ('book', 'mi_id', 'source_relevance', 'illustrators', 'cover_authors', 'translators',
+                 'edition', 'edition_index', 'pages', 'mi_publisher', 'mi_pubdate', 'pubyear',
+                 'mi_isbn', 'ean', 'mi_language', 'dimensions', 'print_run', 'price',
+                 'issue_number', 'note', 'cover_type', 'cover_url', 'cover_urls')
+
+    def __init__(self, book):
+        self.book = book
+        for name in self.__slots__[1:]:
+            setattr(self, name, None)
+        # legie id gets issue year appended while building metadata
+        self.mi_id = getattr(book, 'mi_id', None)
+
+    def __getattr__(self, name):
+        # called only for names not stored on issue itself
+        if name == 'book':
+            raise AttributeError(name)
+        return getattr(self.book, name)
+
+def book_stub(legie_id):
+    '''
+    Book level details of book whose main page is not parsed (only issues are), issues
+    are compared and selected the same way as with parsed book page
+    '''
+    mi = Metadata('')
+    mi.mi_id = legie_id
+    mi.mi_title = ''
+    mi.mi_authors, mi.category, mi.alt_title, mi.contained_in, mi.sep_published = [], [], [], [], []
+    mi.awards, mi.tales_in_book = [], []
+    mi.subtitle = mi.mi_series = mi.mi_series_index = mi.original_title = mi.alt_original_title = None
+    mi.world = mi.original_date = mi.original_year = mi.original_month = None
+    mi.rating_star = mi.rating10 = mi.rating100 = mi.rating_count = None
+    mi.rating = 0
+    mi.mi_comments = mi.external_links = ''
+    return mi
 
 class Worker(Thread): # Get details
     '''
     Get book details from legie.cz book page in a separate thread
     '''
 
-    def __init__(self, url, result_queue, browser, log, relevance, plugin, timeout=20):
+    def __init__(self, url, result_queue, browser, log, relevance, plugin, timeout=20, prefs=None, cancel=None, document=None, identifiers=None, series=None):
         Thread.__init__(self)
         self.daemon = True
         self.url, self.result_queue = url, result_queue
         self.log, self.timeout = log, timeout
         self.relevance, self.plugin = relevance+1, plugin
+        self.prefs = prefs if prefs is not None else get_snapshot()
+        self.cancel = cancel
+        # parsed book page already downloaded by identify (exact match)
+        self.document = document
+        # SeriesResolver of bulk identify, volumes of found series are resolved for other books
+        self.series = series
+        # identifiers of searched book (bulk identify runs more books at once)
+        self.identifiers = identifiers or {}
         self.browser = browser.clone_browser()
         self.cover_url = self.legie_id = None
-        self.cover_urls = None
 
         self.is_tale = True if '/povidka/' in url else False
 
@@ -43,11 +108,24 @@ class Worker(Thread): # Get details
         except:
             self.log.exception('*** get_details failed for url: %r'%self.url)
 
+    def is_cancelled(self):
+        return self.cancel is not None and self.cancel.is_set()
+
     def get_details(self):
         try:
-            self.log.info('Get main parsing page: %s'%self.url)
-            root, _ = load_url(self.log, self.url, self.browser)
+            if self.is_cancelled():
+                return
+            if self.document is not None:
+                self.log.info('Using already downloaded main page: %s'%self.url)
+                root = self.document
+            else:
+                self.log.info('Get main parsing page: %s'%self.url)
+                root, _ = load_url(self.log, self.url, self.browser)
 
+            # other worker already found high confidence match
+            if self.is_cancelled():
+                self.log.info('Worker [%s] cancelled.'%self.relevance)
+                return
             self.log.info('Get additional details: %s%s'%(self.url, '/vydani'))
             additional, _ = load_url(self.log, '%s%s'%(self.url, '/vydani'), self.browser)
             if root.xpath('//ul[@id="zalozky"]/li/a[contains(text(), "ocenění")]'):
@@ -68,6 +146,10 @@ class Worker(Thread): # Get details
         mi = Metadata("")
         
         mi = self.parse_main_details(root, mi)
+        if self.series is not None and not self.is_tale:
+            series_url = self.parse_series_url(root)
+            if series_url:
+                self.series.add_series(self.log, self.browser, series_url, mi.mi_authors, self.timeout)
         mi = self.parse_sep_pages(mi, root_tales, root_rewards)
         if self.is_tale:
             mi.translators = []
@@ -81,26 +163,59 @@ class Worker(Thread): # Get details
             mi = self.field_metadata_build(root, mi)
             self.result_queue.put(mi)
         else:
-            mi_list = self.parse_issue_details(additional, mi)
-            mi_list = [self.field_metadata_build(root, m) for m in mi_list]
-            mi_list = self.find_duplicate_issue(mi_list)
-            if mi_list:
-                mi = self.select_best_issue(mi_list)
-                self.result_queue.put(mi)
+            # issue selection runs on parsed issue records,
+            # calibre metadata are built only for issues put into result queue
+            unique_list, best, duplicates = self.select_issues(additional, mi)
+            for m in unique_list:
+                self.result_queue.put(self.field_metadata_build(root, m))
+            if best is not None:
+                self.result_queue.put(self.field_metadata_build(root, best))
+
+    def select_issues(self, additional, mi):
+        '''
+        Returns (unique_list, best, duplicates) - issues with unique title (each one is put
+        into result queue), preferred issue of the other ones (or None) and these other issues
+        '''
+        mi_list = self.parse_issue_details(additional, mi)
+        unique_list, mi_list = self.find_duplicate_issue(mi_list)
+        best = self.select_best_issue(mi_list) if mi_list else None
+        return unique_list, best, mi_list
         
-    def get_parse_obalkyknih_cover(self, isbn):
-        url_obalky = 'https://www.obalkyknih.cz/view?isbn=%s'%isbn
+    def get_rating_details(self, root, title, authors, book_id):
+        '''
+        Minimal metadata for ratings refresh - rating and rating identifiers parsed from main page,
+        None when the book has no rating
+        '''
+        rating_star, rating10, rating100, rating_count = self.parse_rating(root)
+        if not rating_star:
+            return None
+        mi = Metadata(title or self.parse_title(root), authors or self.parse_authors(root))
+        mi.rating = rating_star
+        mi.source_relevance = self.relevance
+        mi.set_identifier('legie_povidka' if self.is_tale else 'legie', book_id)
+        values = {
+            MetadataIdentifier.RATING: rating100,
+            MetadataIdentifier.RATING10: rating10,
+            MetadataIdentifier.RATING5: rating_star,
+            MetadataIdentifier.RATING_COUNT: rating_count,
+        }
+        # (id_string, check_bool, visible_desc, identifier_key)
+        for item in self.prefs.get(PluginPrefsName.APPEND_TO_IDENTIFIERS):
+            if item[1] and values.get(item[0], None):
+                mi.set_identifier(item[3], str(values[item[0]]))
+        self.log.info('Parsed rating:%s'%mi.rating)
+        return mi
 
+    def get_obalkyknih_cover(self, codes):
+        '''
+        Returns obalkyknih.cz cover url for first of codes (ISBN, EAN) with cover,
+        codes from all workers are resolved in batches
+        '''
+        from .obalky import resolver
         try:
-            self.log.info('Get obalkyknih page:%s'%url_obalky)
-            root, _ = load_url(self.log, url_obalky, self.browser)
-        except Exception as e:
-            self.log.error('Load url problem: %r - %s' % (url_obalky, e))
-            return
-        cover_url = self.parse_first(root, '//a[@data-lightbox="book-cover"]/@href', 'obalkyknih_cover')
-        if cover_url:
-            return cover_url
-        else:
+            return resolver.cover_url(self.log, self.browser, codes)
+        except:
+            self.log.exception('Error resolving obalkyknih cover for: %s'%codes)
             return None
 
     def parse_main_details(self, root, mi):
@@ -237,25 +352,26 @@ class Worker(Thread): # Get details
         mi_node_list = root.xpath('//div[@id="vycet_vydani"]/div[@class="vydani cl"]')
         mi_res_issues = []
         for i, mi_node in enumerate(mi_node_list):
-            mi = mi_base.deepcopy()
+            mi = IssueRecord(mi_base)
             mi.source_relevance = float('%d.%d'%(self.relevance, i))
+            table = self.parse_issue_table(mi_node)
             ####### ISSUE SPECIFIC
             try:
-                mi.illustrators = self.parse_illustrators(mi_node)
+                mi.illustrators = self.parse_illustrators(table)
                 mi.illustrators = [mi.illustrators] if mi.illustrators else []
                 self.log.info('Parsed illustrators:%s'%mi.illustrators)
             except:
                 self.log.exception('Error parsing illustrators for url: %r'%self.url)
                 
             try:
-                mi.cover_authors = self.parse_cover_authors(mi_node)
+                mi.cover_authors = self.parse_cover_authors(table)
                 mi.cover_authors = [mi.cover_authors] if mi.cover_authors else []
                 self.log.info('Parsed cover authors:%s'%mi.cover_authors)
             except:
                 self.log.exception('Error parsing cover authors for url: %r'%self.url)
                 
             try:
-                mi.translators = self.parse_translators(mi_node)
+                mi.translators = self.parse_translators(table)
                 mi.translators = [mi.translators] if mi.translators else []
                 self.log.info('Parsed translators:%s'%mi.translators)
             except:
@@ -269,7 +385,7 @@ class Worker(Thread): # Get details
                 self.log.exception('Error parsing editions for url: %r'%self.url)
                 
             try:
-                mi.pages = self.parse_pages(mi_node)
+                mi.pages = self.parse_pages(table)
                 self.log.info('Pages %s'%mi.pages)
             except:
                 self.log.exception('Error parsing pages number for url: %r'%self.url)
@@ -281,7 +397,7 @@ class Worker(Thread): # Get details
                 self.log.exception('Error parsing publisher for url: %r'%self.url)
                 
             try:
-                mi.mi_pubdate, mi.pubyear = self.parse_pubdate(mi_node)
+                mi.mi_pubdate, mi.pubyear = self.parse_pubdate(mi_node, table)
                 self.log.info('Parsed pubdate:%s'%mi.mi_pubdate)
             except:
                 self.log.exception('Error parsing pubdate for url: %r'%self.url)
@@ -299,43 +415,43 @@ class Worker(Thread): # Get details
                 self.log.exception('Error parsing EAN for url: %r'%self.url)
 
             try:
-                mi.mi_language = self.parse_languages(mi_node)
+                mi.mi_language = self.parse_languages(table)
                 self.log.info('Parsed lang:%s'%mi.mi_language)
             except:
                 self.log.exception('Error parsing lang for url: %r'%self.url)
 
             try:
-                mi.dimensions = self.parse_dimensions(mi_node)
+                mi.dimensions = self.parse_dimensions(table)
                 self.log.info('Parsed dimensions:%s'%mi.dimensions)
             except:
                 self.log.exception('Error parsing dimensions for url: %r'%self.url)
             
             try:
-                mi.print_run = self.parse_print_run(mi_node)
+                mi.print_run = self.parse_print_run(table)
                 self.log.info('Parsed print_run:%s'%mi.print_run)
             except:
                 self.log.exception('Error parsing print_run for url: %r'%self.url)
             
             try:
-                mi.price = self.parse_price(mi_node)
+                mi.price = self.parse_price(table)
                 self.log.info('Parsed price:%s'%mi.price)
             except:
                 self.log.exception('Error parsing price for url: %r'%self.url)
 
             try:
-                mi.issue_number = self.parse_issue_number(mi_node)
+                mi.issue_number = self.parse_issue_number(table)
                 self.log.info('Parsed issue_number:%s'%mi.issue_number)
             except:
                 self.log.exception('Error parsing issue_number for url: %r'%self.url)
 
             try:
-                mi.note = self.parse_note(mi_node)
+                mi.note = self.parse_note(table)
                 self.log.info('Parsed note:%s'%mi.note)
             except:
                 self.log.exception('Error parsing note for url: %r'%self.url)
 
             try:
-                mi.cover_type = self.parse_cover_type(mi_node)
+                mi.cover_type = self.parse_cover_type(table)
                 self.log.info('Parsed cover_type:%s'%mi.cover_type)
             except:
                 self.log.exception('Error parsing cover_type for url: %r'%self.url)
@@ -349,12 +465,13 @@ class Worker(Thread): # Get details
                 self.log.exception('Error parsing cover_url for url: %r'%self.url)
 
             try:
-                self.cover_urls = self.parse_cover_list(mi_node)
-                if self.cover_urls:
-                    self.cover_urls = ['%s/%s'%(self.plugin.BASE_URL, cover) for cover in self.cover_urls]
-                self.log.info('Parsed cover:%s'%self.cover_urls)
+                # all covers of this issue (kept on issue, covers follow the selected issue)
+                mi.cover_urls = self.parse_cover_list(mi_node)
+                if mi.cover_urls:
+                    mi.cover_urls = ['%s/%s'%(self.plugin.BASE_URL, cover) for cover in mi.cover_urls]
+                self.log.info('Parsed cover:%s'%mi.cover_urls)
             except:
-                self.cover_urls = None
+                mi.cover_urls = None
                 self.log.exception('Error parsing cover_urls for url: %r'%self.url)
 
             mi_res_issues.append(mi)
@@ -362,55 +479,79 @@ class Worker(Thread): # Get details
         return mi_res_issues
     
     def find_duplicate_issue(self, mi_list):
+        '''
+        Split issues into unique ones (by resulting title and authors) and duplicates
+        which need choosing the best issue
+        '''
         # No duplicates
         if len(mi_list) == 1:
-            return mi_list
+            return [], mi_list
 
         dupli = dict()
         for i, mi in enumerate(mi_list):
-            title_token = ''.join([mi.title if mi.title else '', ''.join(mi.authors if mi.authors else [])])
+            # title is compared with final legie id (with issue year) as in built metadata
+            if get_builders(self.prefs).identifier_enabled(MetadataIdentifier.ORIG_ID):
+                mi.mi_id = self.issue_id(mi)
+            title_token = ''.join([self.build_title(mi), ''.join(self.build_authors(mi))])
             if dupli.get(title_token, None):
                 dupli[title_token].append(i)
             else:
                 dupli[title_token] = [i]
-        idx_deleting = []
-        for k, v in dupli.items():
-            if len(v) == 1:
-                self.result_queue.put(mi_list[v[0]])
-                idx_deleting.append(v[0])
-        mi_list = [item for idx, item in enumerate(mi_list) if idx not in idx_deleting]
-        return mi_list
+        idx_unique = [v[0] for v in dupli.values() if len(v) == 1]
+        unique_list = [mi_list[idx] for idx in idx_unique]
+        mi_list = [item for idx, item in enumerate(mi_list) if idx not in idx_unique]
+        return unique_list, mi_list
+
+    def issue_id(self, mi):
+        '''
+        Returns legie id of issue with issue year appended (legie:123#2001)
+        '''
+        book_id = getattr(mi.book, 'mi_id', None) if isinstance(mi, IssueRecord) else mi.mi_id
+        if book_id and mi.pubyear:
+            return '%s#%s'%(book_id, mi.pubyear)
+        return book_id
 
     def select_best_issue(self, mi_list):
          # 0:default - 1:cz_new - 2:cz_old - 3:sk_new - 4:sk_old
 
-        wanted_lang = self.plugin.identifiers.get('language', None)
-        wanted_pubyear = self.plugin.identifiers.get('pubdate', None)
-        wanted_publisher = self.plugin.identifiers.get('publisher', None)
+        wanted_lang = self.identifiers.get('language', None)
+        wanted_pubyear = self.identifiers.get('pubdate', None)
+        wanted_publisher = self.identifiers.get('publisher', None)
+        issue_pref = self.prefs.get(PluginPrefsName.ISSUE_PREFERENCE)
+        publisher_filter = self.prefs.get(PluginPrefsName.PUBLISHER_FILTER)
 
         if not wanted_lang and not wanted_publisher and not wanted_pubyear and \
-            get_pref(PluginPrefsName.ISSUE_PREFERENCE) == 0 and get_pref(PluginPrefsName.MAX_COVERS) <= 1:
+            issue_pref == 0 and self.prefs.get(PluginPrefsName.MAX_COVERS) <= 1:
             self.log.info('No need for special issue merging. '
                           'Keeping all issues for built-in merging methods.')
             return mi_list[0] if mi_list else None
 
         # preference lang cs
         wanted_lang = 'cs' if wanted_lang is None and \
-            get_pref(PluginPrefsName.ISSUE_PREFERENCE) in (1, 2) else wanted_lang
+            issue_pref in (1, 2) else wanted_lang
         # preference lang sk
         wanted_lang = 'sk' if wanted_lang is None and \
-            get_pref(PluginPrefsName.ISSUE_PREFERENCE) in (3, 4) else wanted_lang
+            issue_pref in (3, 4) else wanted_lang
 
-        year_node = [int(mi.pubyear) for mi in mi_list]
+        year_node = [int(mi.pubyear) for mi in mi_list if mi.pubyear]
         # preference pubdate newest
         if not wanted_pubyear and year_node and \
-            get_pref(PluginPrefsName.ISSUE_PREFERENCE) in (1, 3):
+            issue_pref in (1, 3):
             wanted_pubyear = max(year_node)
         # preference pubdate oldest
         elif not wanted_pubyear and year_node and \
-            get_pref(PluginPrefsName.ISSUE_PREFERENCE) in (2, 4):
+            issue_pref in (2, 4):
             wanted_pubyear = min(year_node)
         
+        c_wanted_publisher = None
+        if wanted_publisher:
+            # compare with remapped version
+            c_wanted_publisher = self._convert_to_calibre(wanted_publisher.replace('_', ' '),
+                                                          self.prefs.mapping(PluginPrefsName.KEY_PUBLISHER_MAPPINGS),
+                                                          publisher_filter)
+            if c_wanted_publisher:
+                c_wanted_publisher = strip_accents_cached(c_wanted_publisher.lower().replace('_', ''))
+
         best_issue = None
         best_relevance = 10_000 # MAX_VAL
         for issue_index, mi in enumerate(mi_list):
@@ -425,15 +566,14 @@ class Worker(Thread): # Get details
             if mi.mi_publisher and wanted_publisher:
                 # compare with remapped version
                 c_mi_publisher = self._convert_to_calibre(mi.mi_publisher,
-                                                            get_pref(PluginPrefsName.KEY_PUBLISHER_MAPPINGS),
-                                                            get_pref(PluginPrefsName.PUBLISHER_FILTER))
-                c_wanted_publisher = self._convert_to_calibre(wanted_publisher.replace('_', ' '),
-                                                                get_pref(PluginPrefsName.KEY_PUBLISHER_MAPPINGS),
-                                                                get_pref(PluginPrefsName.PUBLISHER_FILTER))
+                                                          self.prefs.mapping(PluginPrefsName.KEY_PUBLISHER_MAPPINGS),
+                                                          publisher_filter)
+                if c_mi_publisher:
+                    c_mi_publisher = strip_accents_cached(c_mi_publisher.lower().replace('_', ''))
                 if c_mi_publisher and c_wanted_publisher and \
-                    (strip_accents(c_wanted_publisher.lower().replace('_', '')) == strip_accents(c_mi_publisher.lower().replace('_', '')) or\
-                    strip_accents(c_wanted_publisher.lower().replace('_', '')) in strip_accents(c_mi_publisher.lower().replace('_', '')) or\
-                    strip_accents(c_mi_publisher.lower().replace('_', '')) in strip_accents(c_wanted_publisher.lower().replace('_', ''))):
+                    (c_wanted_publisher == c_mi_publisher or\
+                    c_wanted_publisher in c_mi_publisher or\
+                    c_mi_publisher in c_wanted_publisher):
                     relevance -= 2
                 else:
                     relevance += 1_000
@@ -450,7 +590,6 @@ class Worker(Thread): # Get details
 
         if best_issue is not None:
             self.cover_url = mi_list[best_issue].cover_url
-            #self.cover_urls = img_urls
             return mi_list[best_issue]
         else:
             return mi_list[0]
@@ -464,42 +603,22 @@ class Worker(Thread): # Get details
         mi_result.cover_url = mi.cover_url
 
         # User defined options
-        max_covers = get_pref(PluginPrefsName.MAX_COVERS)
-        obalkyknih_cover = get_pref(PluginPrefsName.OBALKYKNIH_COVER)
-        append_to_comments = get_pref(PluginPrefsName.APPEND_TO_COMMENTS)
-        publication_date = get_pref(PluginPrefsName.PUBLICATION_DATE)
-        swap_authors = get_pref(PluginPrefsName.SWAP_AUTHORS)
-        only_one_author = get_pref(PluginPrefsName.ONE_AUTHOR)
-        author_role = get_pref(PluginPrefsName.AUTHOR_ROLE)
-  
-        title_line = get_pref(PluginPrefsName.TITLE_LINE)
-        publisher_line = get_pref(PluginPrefsName.PUBLISHER_LINE)
-        series_line = get_pref(PluginPrefsName.SERIES_LINE)
-        series_index_field = get_pref(PluginPrefsName.SERIES_INDEX_FIELD)
-
-        append_to_tags = get_pref(PluginPrefsName.APPEND_TO_TAG)
-        append_to_identifiers = get_pref(PluginPrefsName.APPEND_TO_IDENTIFIERS)
-        authors_include = get_pref(PluginPrefsName.AUTHORS_INCLUDE)
-        translators_include = get_pref(PluginPrefsName.TRANSLATORS_INCLUDE)
-        illustrators_include = get_pref(PluginPrefsName.ILLUSTRATORS_INCLUDE)
-        cover_authors_include = get_pref(PluginPrefsName.COVER_AUTHORS_INCLUDE)
-
-        if mi.mi_id and dict([[tupl[0], tupl[1]] for tupl in append_to_identifiers]).get(MetadataIdentifier.ORIG_ID, True):
+        max_covers = self.prefs.get(PluginPrefsName.MAX_COVERS)
+        obalkyknih_cover = self.prefs.get(PluginPrefsName.OBALKYKNIH_COVER)
+        publication_date = self.prefs.get(PluginPrefsName.PUBLICATION_DATE)
+        builders = get_builders(self.prefs)
+
+        if mi.mi_id and builders.identifier_enabled(MetadataIdentifier.ORIG_ID):
             if self.is_tale:
                 mi_result.set_identifier('legie_povidka', mi.mi_id)
                 self.legie_id = mi.mi_id
             else:
-                if mi.pubyear:
-                    mi_result.set_identifier('legie', '%s#%s'%(mi.mi_id, mi.pubyear))
-                    mi_result.mi_id = '%s#%s'%(mi.mi_id, mi.pubyear)
-                    self.legie_id = '%s#%s'%(mi.mi_id, mi.pubyear)
-                    mi.mi_id = '%s#%s'%(mi.mi_id, mi.pubyear)
-                else:
-                    mi_result.mi_id = mi.mi_id
-                    mi_result.set_identifier('legie', mi.mi_id)
-                    self.legie_id = mi.mi_id
+                mi.mi_id = self.issue_id(mi)
+                mi_result.mi_id = mi.mi_id
+                mi_result.set_identifier('legie', mi.mi_id)
+                self.legie_id = mi.mi_id
 
-                if mi.ean and dict([[tupl[0], tupl[1]] for tupl in append_to_identifiers]).get(MetadataIdentifier.EAN, True):
+                if mi.ean and builders.identifier_enabled(MetadataIdentifier.EAN):
                     mi_result.set_identifier('ean', mi.ean)
 
                 if mi.mi_id:
@@ -517,412 +636,60 @@ class Worker(Thread): # Get details
             self.log.exception('Error adding published date.')
         
         try:
-            mi_result.comments = ''
-            # append_to_comments - list of tuples
-            # (id_string, check_bool, visible_desc)
-            def get_comment_variable(argument):
-                if argument == MetadataIdentifier.DESCRIPTION and mi.mi_comments:
-                    return mi.mi_comments
-                elif argument == MetadataIdentifier.HR:
-                    return '<hr>'
-                elif argument == MetadataIdentifier.PAGES and mi.pages:
-                    return '<p id="numberOfPages"><em>Počet stran:</em> %s</p>' %mi.pages
-                elif argument == MetadataIdentifier.PRINT_RUN and mi.print_run:
-                    return '<p id="printRun"><em>Náklad (ks):</em> %s</p>' %mi.print_run
-                elif argument == MetadataIdentifier.DIMENSIONS and mi.dimensions:
-                    return '<p id="dimensions"><em>Rozměry:</em> %s</p>' %mi.dimensions
-                elif argument == MetadataIdentifier.COVER_TYPE and mi.cover_type:
-                    return '<p id="coverType"><em>Vazba:</em> %s</p>' %mi.cover_type
-                elif argument == MetadataIdentifier.NOTE and mi.note:
-                    return '<p id="note"><em>Poznámka:</em> %s</p>' %mi.note
-                elif argument == MetadataIdentifier.ISSUE_NUMBER and mi.issue_number:
-                    return '<p id="issueNumber"><em>Vydání:</em> %s</p>' %mi.issue_number
-                elif argument == MetadataIdentifier.PRICE and mi.price:
-                    return '<p id="price"><em>Cena:</em> %s</p>' %mi.price
-                elif argument == MetadataIdentifier.TITLE and mi.mi_title:
-                    return '<p id="title"><em>Název:</em> %s</p>' %mi.mi_title
-                elif argument == MetadataIdentifier.SUBTITLE and mi.subtitle:
-                    return '<p id="subtitle"><em>Podtitul:</em> %s</p>' %mi.subtitle
-                elif argument == MetadataIdentifier.ORIGINAL_TITLE and mi.original_title:
-                    return '<p id="origTitle"><em>Původní název:</em> %s</p>' %mi.original_title
-                elif argument == MetadataIdentifier.ALT_ORIGINAL_TITLE and mi.alt_original_title:
-                    return '<p id="altOrigTitle"><em>Joný (obecně známý) název:</em> %s</p>' %mi.alt_original_title
-                elif argument == MetadataIdentifier.ORIGINAL_YEAR and mi.original_year:
-                    return '<p id="origYear"><em>Rok prvního vydání:</em> %s</p>' %mi.original_year
-                elif argument == MetadataIdentifier.PUB_YEAR and mi.pubyear:
-                    return '<p id="pubYear"><em>Rok vydání:</em> %s</p>' %mi.pubyear
-                elif argument == MetadataIdentifier.PUBLISHER and mi.mi_publisher:
-                    return '<p id="publisher"><em>Vydavatel:</em> %s</p>' %mi.mi_publisher
-                elif argument == MetadataIdentifier.WORLD and mi.world:
-                    return '<p id="world"><em>Svět:</em> %s</p>' %mi.world
-                elif argument == MetadataIdentifier.RATING and mi.rating100:
-                    return '<p id="rating100"><em>Hodnocení (%%):</em> %s</p>' %mi.rating100
-                elif argument == MetadataIdentifier.RATING10 and mi.rating10:
-                    return '<p id="rating10"><em>Hodnocení (0-10):</em> %s</p>' %mi.rating10
-                elif argument == MetadataIdentifier.RATING5 and mi.rating_star:
-                    return '<p id="rating5"><em>Hodnocení (0-5):</em> %s</p>' %mi.rating_star
-                elif argument == MetadataIdentifier.RATING_COUNT and mi.rating_count:
-                    return '<p id="ratingCount"><em>Počet hodnocení:</em> %s</p>' %mi.rating_count
-                elif argument == MetadataIdentifier.LANGUAGE and mi.mi_language:
-                    return '<p id="language"><em>Jazyk vydání:</em> %s </p>' %mi.mi_language
-                elif argument == MetadataIdentifier.ISBN and mi.mi_isbn:
-                    return '<p id="isbn"><em>ISBN:</em> %s </p>' %mi.mi_isbn
-                elif argument == MetadataIdentifier.EAN and mi.ean:
-                    return '<p id="ean"><em>EAN:</em> %s </p>' %mi.ean
-                elif argument == MetadataIdentifier.ORIG_ID and mi.mi_id and not self.is_tale:
-                    return '<p id="legie"><em>legie:</em> %s</p>' %mi.mi_id
-                elif argument == MetadataIdentifier.ORIG_ID and mi.mi_id and self.is_tale:
-                    return '<p id="legie_povidka"><em>legie povídka:</em> %s</p>' %mi.mi_id
-                elif argument == MetadataIdentifier.SOURCE_RELEVANCE and mi.source_relevance:
-                    return '<p id="relevance"><em>Pořadí ve vyhledávání:</em> %s</p>' %mi.source_relevance
-                elif argument == MetadataIdentifier.SERIES and mi.mi_series:
-                    if mi.mi_series_index:
-                        return '<p id="series"><em>Série:</em> %s [%s]</p>' %(mi.mi_series, mi.mi_series_index)
-                    else:
-                        return '<p id="series"><em>Série:</em> %s</p>' %mi.mi_series
-                elif argument == MetadataIdentifier.EDITION and mi.edition:
-                    if mi.edition_index:
-                        return '<p id="edition"><em>Edice:</em> %s [%s]</p>' %(mi.edition, mi.edition_index)
-                    else:
-                        return '<p id="edition"><em>Edice:</em> %s</p>' %mi.edition
-                elif argument == MetadataIdentifier.CONTAINED_IN and mi.contained_in:
-                    return '<p id="containedIn"><em>Součástí knih:</em> <br>%s</p>'%('<br>'.join(mi.contained_in))
-                elif argument == MetadataIdentifier.SEP_PUBLISHED and mi.sep_published:
-                    return '<p id="sepPublished"><em>Vydáno i samostatně jako:</em> %s</p>'%(', '.join(mi.sep_published))
-                elif argument == MetadataIdentifier.ALT_TITLE and mi.alt_title:
-                    return '<p id="altTitleList"><em>Vydáno i pod názvy:</em> %s</p>'%(', '.join(mi.alt_title))
-                elif argument == MetadataIdentifier.AUTHORS and mi.mi_authors:
-                    return '<p id="authors"><em>Autoři:</em> %s</p>'%(' & '.join(mi.mi_authors))
-                elif argument == MetadataIdentifier.TRANSLATION and mi.translators:
-                    return '<p id="translator"><em>Překlad:</em> %s</p>'%(' & '.join(mi.translators))
-                elif argument == MetadataIdentifier.ILLUSTRATION and mi.illustrators:
-                    return '<p id="illustrators"><em>Ilustrace:</em> %s</p>'%(' & '.join(mi.illustrators))
-                elif argument == MetadataIdentifier.COVER_AUTHORS and mi.cover_authors:
-                    return '<p id="coverAuthors"><em>Autoři obálky:</em> %s</p>'%(' & '.join(mi.cover_authors))
-                elif argument == MetadataIdentifier.CATEGORY and mi.category:
-                    return '<p id="category"><em>Kategorie:</em> %s</p>' %', '.join(mi.category)
-                elif argument == MetadataIdentifier.AWARDS and mi.awards:
-                    return '<p id="awards"><em>Ocenění:</em> <br>%s</p>' %'<br>'.join(mi.awards)
-                elif argument == MetadataIdentifier.TALES_IN_BOOK and mi.tales_in_book:
-                    return '<p id="bookParts"><em>Části díla:</em> <br>%s</p>' %'<br>'.join(mi.tales_in_book)
-                elif argument == MetadataIdentifier.EXTERNAL_LINKS and mi.external_links:
-                    return '<p id="externalLinks"><em>Externí odkazy:</em> <br>%s</p>' %mi.external_links
-                else:
-                    return ''
-            
-            self.log.info('append to comments:', append_to_comments)
-            for item in append_to_comments:
-                if item[1]:
-                    argument = item[0]
-                    # converts parsed information into html paragraph string
-                    mi_result.comments = '%s %s'%(mi_result.comments, get_comment_variable(item[0]))
+            # converts parsed information into html paragraph strings
+            mi_result.comments = builders.build_comments(mi, self.is_tale)
         except:
             self.log.exception('Error adding more info to comments for url: %r'%self.url)
-            mi.comments = mi.mi_comments
+            mi_result.comments = mi.mi_comments
                     
         try:
-            def get_tag_variable(argument):
-                switch_check = {
-                    MetadataIdentifier.CATEGORY: mi.category,
-                    MetadataIdentifier.PAGES: mi.pages,
-                    MetadataIdentifier.AUTHORS: mi.mi_authors,
-                    MetadataIdentifier.TRANSLATION: mi.translators,
-                    MetadataIdentifier.ILLUSTRATION: mi.illustrators,
-                    MetadataIdentifier.COVER_AUTHORS: mi.cover_authors,
-                    MetadataIdentifier.TITLE: mi.mi_title,
-                    MetadataIdentifier.ORIGINAL_TITLE: mi.original_title,
-                    MetadataIdentifier.ORIGINAL_YEAR: mi.original_year,
-                    MetadataIdentifier.PUB_YEAR: mi.pubyear,
-                    MetadataIdentifier.PUBLISHER: mi.mi_publisher,
-                    MetadataIdentifier.SERIES: (mi.mi_series, mi.mi_series_index),
-                    MetadataIdentifier.EDITION: (mi.edition, mi.edition_index),
-                    MetadataIdentifier.RATING: mi.rating100,
-                    MetadataIdentifier.RATING5: mi.rating_star,
-                    MetadataIdentifier.RATING10: mi.rating10,
-                    MetadataIdentifier.RATING_COUNT: mi.rating_count,
-                    MetadataIdentifier.ISBN: mi.mi_isbn,
-                    MetadataIdentifier.EAN: mi.ean,
-                    MetadataIdentifier.LANGUAGE: mi.mi_language,
-                    MetadataIdentifier.PRICE: mi.price,
-                    MetadataIdentifier.DIMENSIONS: mi.dimensions,
-                    MetadataIdentifier.PRINT_RUN: mi.print_run,
-                    MetadataIdentifier.ISSUE_NUMBER: mi.issue_number,
-                    MetadataIdentifier.ALT_TITLE: mi.alt_title,
-                    MetadataIdentifier.SEP_PUBLISHED: mi.sep_published,
-                    MetadataIdentifier.CONTAINED_IN: mi.contained_in,
-                    MetadataIdentifier.WORLD: mi.world,
-                    MetadataIdentifier.ALT_ORIGINAL_TITLE: mi.alt_original_title,
-                    MetadataIdentifier.SUBTITLE: mi.subtitle,
-                    MetadataIdentifier.ORIG_ID: mi.mi_id,
-                    MetadataIdentifier.AWARDS: mi.awards,
-                    MetadataIdentifier.COVER_TYPE: mi.cover_type,
-                    MetadataIdentifier.NOTE: mi.note,
-                    MetadataIdentifier.EXTERNAL_LINKS: mi.external_links,
-                    MetadataIdentifier.TALES_IN_BOOK: mi.tales_in_book,
-                    MetadataIdentifier.SOURCE_RELEVANCE: mi.source_relevance,
-                }
-                switch = {
-                    MetadataIdentifier.CATEGORY: mi.category,
-                    MetadataIdentifier.PAGES: ['Počet stran: %s' %mi.pages],
-                    MetadataIdentifier.EAN: ['EAN: %s' %mi.ean],
-                    MetadataIdentifier.COVER_TYPE: ['Vazba: %s' %mi.cover_type],
-                    MetadataIdentifier.LANGUAGE: ['Jazyk vydání: %s' %mi.mi_language],
-                    MetadataIdentifier.PRICE: ['Cena: %s' %mi.price],
-                    MetadataIdentifier.DIMENSIONS: ['Rozměry: %s' %mi.dimensions],
-                    MetadataIdentifier.PRINT_RUN: ['Náklad (ks): %s' %mi.print_run],
-                    MetadataIdentifier.ISSUE_NUMBER: ['Vydání: %s' %mi.issue_number],
-                    MetadataIdentifier.WORLD: ['Svět: %s' %mi.world],
-                    MetadataIdentifier.ORIGINAL_YEAR: ['Rok prvního vydání: %s' %mi.original_year],
-                    MetadataIdentifier.PUB_YEAR: ['Rok vydání: %s' %mi.pubyear],
-                    MetadataIdentifier.RATING: ['Hodnocení (%%): %s' %mi.rating100],
-                    MetadataIdentifier.RATING5: ['Hodnocení (0-5): %s' %mi.rating_star],
-                    MetadataIdentifier.RATING10: ['Hodnocení (0-10): %s' %mi.rating10],
-                    MetadataIdentifier.RATING_COUNT: ['Počet hodnocení: %s' %mi.rating_count],
-                    MetadataIdentifier.ISBN: ['ISBN: %s' %mi.mi_isbn],
-                    MetadataIdentifier.SOURCE_RELEVANCE: ['Pořadí ve vyhledávání: %s' %mi.source_relevance]
-                }
-                if switch_check.get(argument, None):
-                    if argument == MetadataIdentifier.ORIG_ID and mi.mi_id and self.is_tale:
-                        return ['legie povídka: %s' %mi.mi_id.replace(',', ';')]
-                    if argument == MetadataIdentifier.ORIG_ID and mi.mi_id and not self.is_tale:
-                        return ['legie: %s' %mi.mi_id.replace(',', ';')]
-                    if argument == MetadataIdentifier.TITLE and mi.mi_title:
-                        return ['Název: %s' %mi.mi_title.replace(',', ';')]
-                    elif argument == MetadataIdentifier.SUBTITLE and mi.subtitle:
-                        return ['Podtitul: %s' %mi.subtitle.replace(',', ';')]
-                    elif argument == MetadataIdentifier.PUBLISHER and mi.mi_publisher:
-                        return ['Vydavatel: %s' %mi.mi_publisher.replace(',', ';')]
-                    elif argument == MetadataIdentifier.ORIGINAL_TITLE and mi.original_title:
-                        return ['Původní název: %s' %mi.original_title.replace(',', ';')]
-                    elif argument == MetadataIdentifier.NOTE and mi.note:
-                        return ['Poznámka: %s' %mi.note.replace(',', ';')]
-                    elif argument == MetadataIdentifier.DIMENSIONS and mi.dimensions:
-                        return ['Rozměry: %s' %mi.dimensions.replace(',', ';')]
-                    elif argument == MetadataIdentifier.PRINT_RUN and mi.print_run:
-                        return ['Náklad (ks): %s' %mi.print_run.replace(',', ';')]
-                    elif argument == MetadataIdentifier.ISSUE_NUMBER and mi.issue_number:
-                        return ['Vydání: %s' %mi.issue_number.replace(',', ';')]
-                    elif argument == MetadataIdentifier.COVER_TYPE and mi.cover_type:
-                        return ['Vazba: %s' %mi.cover_type.replace(',', ';')]
-                    elif argument == MetadataIdentifier.EDITION and mi.edition:
-                        if mi.edition_index:
-                            return ['Edice: %s [%s]' %(mi.edition, mi.edition_index)]
-                        else:
-                            return ['Edice: %s' %mi.edition]
-                    elif argument == MetadataIdentifier.SERIES and mi.mi_series:
-                        if mi.mi_series_index:
-                            return ['Série: %s [%s]' %(mi.mi_series, mi.mi_series_index)]
-                        else:
-                            return ['Série: %s' %mi.mi_series]
-                    elif argument == MetadataIdentifier.ALT_ORIGINAL_TITLE and mi.alt_original_title:
-                        return ['Jiný (obecně známý) název: %s'%t.replace(',', ';') for t in mi.alt_original_title]
-                    elif argument == MetadataIdentifier.SEP_PUBLISHED and mi.sep_published:
-                        return ['Vydáno samostatně i jako: %s'%t.replace(',', ';') for t in mi.sep_published]
-                    elif argument == MetadataIdentifier.CONTAINED_IN and mi.contained_in:
-                        return ['Součástí knihy: %s'%t.replace(',', ';') for t in mi.contained_in]
-                    elif argument == MetadataIdentifier.AUTHORS and mi.mi_authors:
-                        return ['Autor: %s'%a.replace(',', ';') for a in mi.mi_authors]
-                    elif argument == MetadataIdentifier.AUTHORS and mi.mi_authors:
-                        return ['Autor: %s'%a.replace(',', ';') for a in mi.mi_authors]
-                    elif argument == MetadataIdentifier.TRANSLATION and mi.translators:
-                        return ['Překlad: %s'%t.replace(',', ';') for t in mi.translators]
-                    elif argument == MetadataIdentifier.ILLUSTRATION and mi.illustrators:
-                        return ['Ilustrace: %s'%i.replace(',', ';') for i in mi.illustrators]
-                    elif argument == MetadataIdentifier.COVER_AUTHORS and mi.cover_authors:
-                        return ['Autor obálky: %s'%a.replace(',', ';') for a in mi.cover_authors]
-                    elif argument == MetadataIdentifier.AWARDS and mi.awards:
-                        return ['Ocenění: %s'%a.replace(',', ';') for a in mi.awards]
-                    elif argument == MetadataIdentifier.TALES_IN_BOOK and mi.tales_in_book:
-                        return ['Část díla: %s'%t.replace(',', ';') for t in mi.tales_in_book]
-                    elif argument == MetadataIdentifier.ALT_TITLE and mi.alt_title:
-                        return ['Vydáno také pod názvem: %s'%t.replace(',', ';') for t in mi.alt_title]
-                    else:
-                        return switch.get(argument, '')
-                return ''
-
-            for item in append_to_tags:
-                if item[1]:
-                    mi_result.tags.extend(get_tag_variable(item[0]))
+            mi_result.tags.extend(builders.build_tags(mi, self.is_tale))
         except:
             self.log.exception('Error adding additional tags for url: %r'%self.url)
 
-        
         try:
-            def get_identifier_variable(argument):
-                switch_check = {
-                    MetadataIdentifier.CATEGORY: mi.category,
-                    MetadataIdentifier.PAGES: mi.pages,
-                    MetadataIdentifier.AUTHORS: mi.mi_authors,
-                    MetadataIdentifier.TRANSLATION: mi.translators,
-                    MetadataIdentifier.ILLUSTRATION: mi.illustrators,
-                    MetadataIdentifier.COVER_AUTHORS: mi.cover_authors,
-                    MetadataIdentifier.TITLE: mi.mi_title,
-                    MetadataIdentifier.SUBTITLE: mi.subtitle,
-                    MetadataIdentifier.ALT_TITLE: mi.alt_title,
-                    MetadataIdentifier.ORIGINAL_TITLE: mi.original_title,
-                    MetadataIdentifier.ALT_ORIGINAL_TITLE: mi.alt_original_title,
-                    MetadataIdentifier.SEP_PUBLISHED: mi.sep_published,
-                    MetadataIdentifier.CONTAINED_IN: mi.contained_in,
-                    MetadataIdentifier.WORLD: mi.world,
-                    MetadataIdentifier.ORIGINAL_YEAR: mi.original_year,
-                    MetadataIdentifier.PUB_YEAR: mi.pubyear,
-                    MetadataIdentifier.PUBLISHER: mi.mi_publisher,
-                    MetadataIdentifier.SERIES: (mi.mi_series, mi.mi_series_index),
-                    MetadataIdentifier.EDITION: (mi.edition, mi.edition_index),
-                    MetadataIdentifier.RATING: mi.rating100,
-                    MetadataIdentifier.RATING5: mi.rating_star,
-                    MetadataIdentifier.RATING10: mi.rating10,
-                    MetadataIdentifier.RATING_COUNT: mi.rating_count,
-                    MetadataIdentifier.ISBN: mi.mi_isbn,
-                    MetadataIdentifier.EAN: mi.ean,
-                    MetadataIdentifier.LANGUAGE: mi.mi_language,
-                    MetadataIdentifier.PRICE: mi.price,
-                    MetadataIdentifier.DIMENSIONS: mi.dimensions,
-                    MetadataIdentifier.PRINT_RUN: mi.print_run,
-                    MetadataIdentifier.ISSUE_NUMBER: mi.issue_number,
-                    MetadataIdentifier.ORIG_ID: mi.mi_id,
-                    MetadataIdentifier.COVER_TYPE: mi.cover_type,
-                    MetadataIdentifier.NOTE: mi.note,
-                    MetadataIdentifier.EXTERNAL_LINKS: mi.external_links,
-                    MetadataIdentifier.AWARDS: mi.awards,
-                    MetadataIdentifier.TALES_IN_BOOK: mi.tales_in_book,
-                    MetadataIdentifier.SOURCE_RELEVANCE: mi.source_relevance,
-                }
-                return switch_check.get(argument, '')
-            for item in append_to_identifiers:
-                appending = get_identifier_variable(item[0])
-                if item[0] in [MetadataIdentifier.CATEGORY, MetadataIdentifier.TAGS, MetadataIdentifier.AWARDS, MetadataIdentifier.TALES_IN_BOOK, MetadataIdentifier.ALT_TITLE, MetadataIdentifier.SEP_PUBLISHED, MetadataIdentifier.CONTAINED_IN] and appending:
-                    appending = '| '.join([a.replace(',', ';') for a in appending])
-                elif item[0] in [MetadataIdentifier.AUTHORS, MetadataIdentifier.TRANSLATION, MetadataIdentifier.ILLUSTRATION, MetadataIdentifier.COVER_AUTHORS] and appending:
-                    appending = '| '.join([a.replace(',', ';') for a in appending])
-                elif item[0] in [MetadataIdentifier.SERIES, MetadataIdentifier.EDITION] and appending:
-                    if appending[0] and appending[1]:
-                        appending = ' '.join([appending[0].replace(',', '|'), str(appending[1])])
-                    elif appending[0]:
-                        appending = appending[0].replace(',', '|')
-                    else:
-                        appending = None
-                elif isinstance(appending, str) and appending:
-                    appending = appending.replace(',', '|')
-                if item[1] and appending:
-                    if self.is_tale and 'legie' == item[3]:
-                        mi_result.identifiers['legie_povidka'] = str(appending)
-                    else:
-                        mi_result.identifiers[item[3]] = str(appending)
+            for key, value in builders.build_identifiers(mi, self.is_tale):
+                mi_result.identifiers[key] = value
         except:
             self.log.exception('Error adding extra identifiers for url: %r'%self.url)
 
-        def get_metadata_variable(argument):
-            switch_check = {
-                MetadataIdentifier.CATEGORY: ', '.join(mi.category),
-                MetadataIdentifier.PAGES: mi.pages,
-                MetadataIdentifier.AUTHORS: ' & '.join(mi.mi_authors),
-                MetadataIdentifier.ILLUSTRATION: ' & '.join(mi.illustrators),
-                MetadataIdentifier.TRANSLATION: ' & '.join(mi.translators),
-                MetadataIdentifier.COVER_AUTHORS: ' & '.join(mi.cover_authors),
-                MetadataIdentifier.WORLD: mi.world,
-                MetadataIdentifier.SEP_PUBLISHED: ', '.join(mi.sep_published),
-                MetadataIdentifier.CONTAINED_IN: ', '.join(mi.contained_in),
-                MetadataIdentifier.TITLE: mi.mi_title,
-                MetadataIdentifier.SUBTITLE: mi.subtitle,
-                MetadataIdentifier.ALT_TITLE: ', '.join(mi.alt_title),
-                MetadataIdentifier.ALT_ORIGINAL_TITLE: mi.alt_original_title,
-                MetadataIdentifier.ORIGINAL_TITLE: mi.original_title,
-                MetadataIdentifier.ORIGINAL_YEAR: mi.original_year,
-                MetadataIdentifier.PUB_YEAR: mi.pubyear,
-                MetadataIdentifier.PUBLISHER: mi.mi_publisher,
-                MetadataIdentifier.SERIES: mi.mi_series,
-                MetadataIdentifier.SERIES_INDEX: mi.mi_series_index,
-                MetadataIdentifier.EDITION: mi.edition,
-                MetadataIdentifier.EDITION_INDEX: mi.edition_index,
-                MetadataIdentifier.RATING: mi.rating100,
-                MetadataIdentifier.RATING5: mi.rating_star,
-                MetadataIdentifier.RATING10: mi.rating10,
-                MetadataIdentifier.RATING_COUNT: mi.rating_count,
-                MetadataIdentifier.ISBN: mi.mi_isbn,
-                MetadataIdentifier.EAN: mi.ean,
-                MetadataIdentifier.LANGUAGE: mi.mi_language,
-                MetadataIdentifier.PRICE: mi.price,
-                MetadataIdentifier.DIMENSIONS: mi.dimensions,
-                MetadataIdentifier.PRINT_RUN: mi.print_run,
-                MetadataIdentifier.ISSUE_NUMBER: mi.issue_number,
-                MetadataIdentifier.ORIG_ID: mi.mi_id,
-                MetadataIdentifier.AWARDS: mi.awards,
-                MetadataIdentifier.COVER_TYPE: mi.cover_type,
-                MetadataIdentifier.NOTE: mi.note,
-                MetadataIdentifier.EXTERNAL_LINKS: mi.external_links,
-                MetadataIdentifier.TALES_IN_BOOK: mi.tales_in_book,
-                MetadataIdentifier.SOURCE_RELEVANCE: mi.source_relevance,
-                MetadataIdentifier.CUSTOM_TEXT: argument
-            }
-            return switch_check.get(argument, None)
-            
         try:
-            mi_result.publisher = ''
-            for item in publisher_line:
-                appending = get_metadata_variable(item[0])
-
-                if appending == MetadataIdentifier.CUSTOM_TEXT and item[1]:
-                    mi_result.publisher += str(item[2])
-                elif item[1] and appending:
-                    mi_result.publisher += str(appending)
+            mi_result.publisher = builders.build_line(builders.publisher_line, mi)
         except:
             mi_result.publisher = mi.mi_publisher if mi.mi_publisher else None
             self.log.exception('Error parsing publisher for url: %r'%self.url)
 
         try:
-            mi_result.series = ''
-            for item in series_line:
-                appending = get_metadata_variable(item[0])
-
-                if appending == MetadataIdentifier.CUSTOM_TEXT and item[1]:
-                    mi_result.series += str(item[2])
-                elif item[1] and appending:
-                    mi_result.series += str(appending)
+            mi_result.series = builders.build_line(builders.series_line, mi)
         except:
             mi_result.series = mi.mi_series if mi.mi_series else None
             self.log.exception('Error parsing series for url: %r'%self.url)
 
         try:
-            mi_result.series_index = None
-            appending = get_metadata_variable(series_index_field[0])
-            if series_index_field[1] and appending:
-                mi_result.series_index = float(appending)
+            mi_result.series_index = builders.build_series_index(mi)
         except:
             mi_result.series_index = mi.mi_series_index if mi.mi_series_index else None
             self.log.exception('Error parsing series_index for title: %r'%mi.mi_title)
 
-        try:
-            mi_result.title = ''
-            for item in title_line:
-                appending = get_metadata_variable(item[0])
-
-                if appending == MetadataIdentifier.CUSTOM_TEXT and item[1]:
-                    mi_result.title += str(item[2])
-                elif item[1] and appending:
-                    mi_result.title += str(appending)
-        except:
-            mi_result.title = mi.mi_title if mi.mi_title else ''
-            self.log.exception('Error parsing title for url: %r'%self.url)
+        mi_result.title = self.build_title(mi)
 
         # cover handling
         try:
             obalky_cover_url = None
 
-            if mi.mi_isbn and obalkyknih_cover:
-                obalky_cover_url = self.get_parse_obalkyknih_cover(mi.mi_isbn)
-            if obalky_cover_url is None and mi.ean and obalkyknih_cover:
-                obalky_cover_url = self.get_parse_obalkyknih_cover(mi.ean)
+            if obalkyknih_cover:
+                obalky_cover_url = self.get_obalkyknih_cover([mi.mi_isbn, mi.ean])
 
             if max_covers == 0:
                 mi_result.has_cover = False
-            elif max_covers > 1 and self.cover_urls:
+            elif max_covers > 1 and mi.cover_urls:
+                cover_urls = list(mi.cover_urls)
                 if obalky_cover_url:
-                    self.cover_urls.append(obalky_cover_url)
-                self.plugin.cache_identifier_to_cover_url(mi.mi_id, self.cover_urls)
+                    cover_urls.append(obalky_cover_url)
+                self.plugin.cache_identifier_to_cover_url(mi.mi_id, cover_urls)
                 if mi.mi_isbn:
                     self.plugin.cache_isbn_to_identifier(mi.mi_isbn, mi.mi_id)
-                mi_result.has_cover = True if self.cover_urls else False
+                mi_result.has_cover = True if cover_urls else False
             else:
                 self.log.info('Parsed URL for cover:%r'%mi.cover_url)
                 if obalky_cover_url:
@@ -942,6 +709,30 @@ class Worker(Thread): # Get details
         except:
             self.log.exception('Error parsing language for url: %r'%self.url)
 
+        mi_result.authors = self.build_authors(mi)
+        mi_result.source_relevance = mi.source_relevance
+        # self.plugin.clean_downloaded_metadata(mi)
+
+        self.log.info(mi_result)
+        return mi_result
+
+    def build_title(self, mi):
+        builders = get_builders(self.prefs)
+        try:
+            return builders.build_line(builders.title_line, mi)
+        except:
+            self.log.exception('Error parsing title for url: %r'%self.url)
+            return mi.mi_title if mi.mi_title else ''
+
+    def build_authors(self, mi):
+        swap_authors = self.prefs.get(PluginPrefsName.SWAP_AUTHORS)
+        only_one_author = self.prefs.get(PluginPrefsName.ONE_AUTHOR)
+        author_role = self.prefs.get(PluginPrefsName.AUTHOR_ROLE)
+        authors_include = self.prefs.get(PluginPrefsName.AUTHORS_INCLUDE)
+        translators_include = self.prefs.get(PluginPrefsName.TRANSLATORS_INCLUDE)
+        illustrators_include = self.prefs.get(PluginPrefsName.ILLUSTRATORS_INCLUDE)
+        cover_authors_include = self.prefs.get(PluginPrefsName.COVER_AUTHORS_INCLUDE)
+
         # authors field creating
         authors_to_add = []
         if author_role:
@@ -1005,13 +796,7 @@ class Worker(Thread): # Get details
                 else:
                     swapped.append('%s %s' %(' '.join(auth_parts[:-1]), auth_parts[-1]))
             authors_to_add = swapped
-            
-        mi_result.authors = authors_to_add
-        mi_result.source_relevance = mi.source_relevance
-        # self.plugin.clean_downloaded_metadata(mi)
-
-        self.log.info(mi_result)
-        return mi_result
+        return authors_to_add
 
     def parse_first(self, root, xpath, loginfo, convert=lambda x: x[0].replace('&nbsp;','').strip()):
         try:
@@ -1039,6 +824,32 @@ class Worker(Thread): # Get details
         except Exception:
             self.log.exception('Error parsing for %s with xpath: %s' % (loginfo, xpath))
 
+    def parse_issue_table(self, root):
+        '''
+        Walk cells of issue 'data_vydani' table only once and collect first text
+        of every cell under the field name its label belongs to
+        '''
+        table = {}
+        for cell in root.xpath('div[@class="data_vydani"]/table//td'):
+            # first text node of the cell (as xpath text()[1] does)
+            text = cell.text
+            if text is None:
+                text = next((child.tail for child in cell if child.tail is not None), None)
+            if text is None:
+                continue
+            for field, match in ISSUE_TABLE_LABELS:
+                if field not in table and match(cell, text):
+                    table[field] = text
+        self.log.info('Found issue table: %s'%table)
+        return table
+
+    def parse_table_value(self, table, field, convert=lambda x: x.strip()):
+        try:
+            value = table.get(field, None)
+            return convert(value) if value else None
+        except Exception:
+            self.log.exception('Error parsing for %s from issue table' % field)
+
     ## GLOBAL INFO
     def parse_legie_id(self, root):
         return self.parse_first(root, '//div[@data-kasp-id]/@data-kasp-id', 'legie_id')
@@ -1052,9 +863,9 @@ class Worker(Thread): # Get details
 
     def parse_series(self, root):
         series_node = self.parse_first(root,'//div[@id="kniha_info"]/div/p/text()[contains(., "série: ")]/following-sibling::a[contains(@href, "serie")]/text()','series', lambda x: x[0].replace('&nbsp;','&').strip().replace("série", ""))
-        filter_check = get_pref(PluginPrefsName.SERIES_FILTER)
+        filter_check = self.prefs.get(PluginPrefsName.SERIES_FILTER)
         if series_node:
-            series_node = self._convert_to_calibre(series_node, get_pref(PluginPrefsName.KEY_SERIES_MAPPINGS), filter_check)
+            series_node = self._convert_to_calibre(series_node, self.prefs.mapping(PluginPrefsName.KEY_SERIES_MAPPINGS), filter_check)
 
         index = self.parse_first(root, '//div[@id="kniha_info"]/div/p/text()[contains(., "díl v sérii: ")]', 'series_index', lambda x: x[0].strip().replace("díl v sérii: ", ""))
         if isinstance(index, str) and str.isdigit(index):
@@ -1065,6 +876,12 @@ class Worker(Thread): # Get details
             index = None
         return series_node, index
 
+    def parse_series_url(self, root):
+        href = self.parse_first(root, '//div[@id="kniha_info"]/div/p/text()[contains(., "série: ")]/following-sibling::a[contains(@href, "serie")]/@href', 'series_url', lambda x: x[0].strip())
+        if not href:
+            return None
+        return href if href.startswith('http') else '%s/%s'%(self.plugin.BASE_URL, href.lstrip('/'))
+
     def parse_rating(self, root):
         rating_node = self.parse_first(root, '//span[@itemprop="ratingValue"]/text()', 'rating_percent', lambda x: int(x[0].strip()))
         star_rating = rating_node/20 if rating_node else None
@@ -1097,7 +914,7 @@ class Worker(Thread): # Get details
         tags = self.parse_all(root, '//a[contains(@href, "tagy/")]/text()', 'category')
         if not tags:
             tags = self.parse_first(root, '//div[@id="povidka_info"]/p/text()[contains(., "Kategorie: ")]', 'category', convert=lambda x: x[0].strip().replace('Kategorie: ', '')).split(' - ')
-        filter_check = get_pref(PluginPrefsName.CATEGORY_FILTER)
+        filter_check = self.prefs.get(PluginPrefsName.CATEGORY_FILTER)
         if tags:
             calibre_tags = self._convert_category_to_calibre_tags(tags, filter_check)
             if len(calibre_tags) > 0:
@@ -1127,29 +944,29 @@ class Worker(Thread): # Get details
     def parse_ean(self, root):
         return self.parse_first(root, './/span[contains(text(), "EAN")]/following-sibling::text()', 'EAN', convert=lambda x: x[0].replace("\xa0", " ").replace(": ", "").strip())
 
-    def parse_dimensions(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[contains(text(), "rozměry")]/text()', 'dimensions', convert=lambda x: x[0].replace("\xa0", " ").replace("rozměry: ", "").strip())
+    def parse_dimensions(self, table):
+        return self.parse_table_value(table, 'dimensions', lambda x: x.replace("\xa0", " ").replace("rozměry: ", "").strip())
 
-    def parse_print_run(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[contains(text(), "výtisků")]/text()', 'print_run', convert=lambda x: x[0].replace("\xa0", " ").replace("počet výtisků: ", "").strip())
+    def parse_print_run(self, table):
+        return self.parse_table_value(table, 'print_run', lambda x: x.replace("\xa0", " ").replace("počet výtisků: ", "").strip())
 
-    def parse_issue_number(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[starts-with(text(), " vydání")]/text()', 'issue_number', convert=lambda x: x[0].replace("\xa0", " ").replace("vydání: ", "").strip())
+    def parse_issue_number(self, table):
+        return self.parse_table_value(table, 'issue_number', lambda x: x.replace("\xa0", " ").replace("vydání: ", "").strip())
 
-    def parse_price(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[contains(text(), "cena")]/text()', 'price', convert=lambda x: x[0].replace("\xa0", " ").replace("cena: ", "").strip())
+    def parse_price(self, table):
+        return self.parse_table_value(table, 'price', lambda x: x.replace("\xa0", " ").replace("cena: ", "").strip())
 
-    def parse_note(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[@colspan="2" and contains(text(), "poznámka:")]/text()', 'note', convert=lambda x: x[0].replace("\xa0", " ").replace("poznámka: ", "").strip())
+    def parse_note(self, table):
+        return self.parse_table_value(table, 'note', lambda x: x.replace("\xa0", " ").replace("poznámka: ", "").strip())
 
-    def parse_cover_type(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[contains(text(), "vazba:")]/text()', 'cover_type', convert=lambda x: x[0].replace("\xa0", " ").replace("vazba: ", "").strip())
+    def parse_cover_type(self, table):
+        return self.parse_table_value(table, 'cover_type', lambda x: x.replace("\xa0", " ").replace("vazba: ", "").strip())
 
-    def parse_pages(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[contains(text(), "počet") and contains(text(), "stran")]/text()', 'numberOfPages', convert=lambda x: x[0].replace("\xa0", " ").replace("počet stran: ", "").strip())
+    def parse_pages(self, table):
+        return self.parse_table_value(table, 'pages', lambda x: x.replace("\xa0", " ").replace("počet stran: ", "").strip())
 
-    def parse_pubdate(self, root):
-        pubdate_node = self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[contains(text(), "přibližné")]/text()', 'pubdate')
+    def parse_pubdate(self, root, table):
+        pubdate_node = self.parse_table_value(table, 'pubdate', lambda x: x.replace('&nbsp;','').strip())
         date_found = date_final = ap_year = None
         if pubdate_node:
             self.log.info('pubdate_node %s'%pubdate_node)
@@ -1175,32 +992,32 @@ class Worker(Thread): # Get details
 
     def parse_publisher(self, root):
         publisher = self.parse_first(root, 'div[@class="data_vydani"]/a[contains(@href, "vydavatel/")]/text()', 'publisher')
-        filter_check = get_pref(PluginPrefsName.PUBLISHER_FILTER)
+        filter_check = self.prefs.get(PluginPrefsName.PUBLISHER_FILTER)
         if publisher:
-            publisher = self._convert_to_calibre(publisher, get_pref(PluginPrefsName.KEY_PUBLISHER_MAPPINGS), filter_check)
+            publisher = self._convert_to_calibre(publisher, self.prefs.mapping(PluginPrefsName.KEY_PUBLISHER_MAPPINGS), filter_check)
         return publisher
     
     def parse_editions(self, root):
         series_node = self.parse_first(root,'div[@class="data_vydani" and contains(., "edici")]/a[contains(@href, "edice/")]/text()','edition', lambda x: x[0].replace('&nbsp;','&').strip())
-        filter_check = get_pref(PluginPrefsName.SERIES_FILTER)
+        filter_check = self.prefs.get(PluginPrefsName.SERIES_FILTER)
         if series_node:
-            series_node = self._convert_to_calibre(series_node, get_pref(PluginPrefsName.KEY_SERIES_MAPPINGS), filter_check)
+            series_node = self._convert_to_calibre(series_node, self.prefs.mapping(PluginPrefsName.KEY_SERIES_MAPPINGS), filter_check)
         index = self.parse_first(root, 'div[@class="data_vydani" and contains(., "edici")]/a[contains(@href, "edice/")]/following-sibling::text()[contains(., "číslem")]',
                                  'edition_index', lambda x: x[0].replace("\xa0", "").replace("&nbsp;", "").replace("podčíslem", "").strip())
         index = float(''.join(i for i in index if i.isdigit())) if index else None
         return series_node, index
 
-    def parse_languages(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//tr/td[contains(text(), "jazyk")]/text()', 'languages', convert=lambda x: x[0].replace("\xa0", " ").replace("&nbsp;", " ").replace("jazyk vydání: ", "").replace("cz", "cs").strip())
+    def parse_languages(self, table):
+        return self.parse_table_value(table, 'languages', lambda x: x.replace("\xa0", " ").replace("&nbsp;", " ").replace("jazyk vydání: ", "").replace("cz", "cs").strip())
 
-    def parse_translators(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//td[contains(text(), "překlad:")]/text()', 'translators', lambda x: x[0].replace("\xa0", "").replace("&nbsp;", "").replace('překlad:','').strip())
+    def parse_translators(self, table):
+        return self.parse_table_value(table, 'translators', lambda x: x.replace("\xa0", "").replace("&nbsp;", "").replace('překlad:','').strip())
 
-    def parse_illustrators(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//td[contains(text(), "ilustrací:")]/text()', 'illustrators', lambda x: x[0].replace("\xa0", "").replace("&nbsp;", "").replace('autorilustrací:','').strip())
+    def parse_illustrators(self, table):
+        return self.parse_table_value(table, 'illustrators', lambda x: x.replace("\xa0", "").replace("&nbsp;", "").replace('autorilustrací:','').strip())
 
-    def parse_cover_authors(self, root):
-        return self.parse_first(root, 'div[@class="data_vydani"]/table//td[contains(text(), "obálky:")]/text()', 'cover_authors', lambda x: x[0].replace("\xa0", "").replace("&nbsp;", "").replace('autorobálky:','').strip())
+    def parse_cover_authors(self, table):
+        return self.parse_table_value(table, 'cover_authors', lambda x: x.replace("\xa0", "").replace("&nbsp;", "").replace('autorobálky:','').strip())
 
     def parse_cover(self, root):
         return self.parse_first(root, '//img[@class="obalk"]/@src', 'cover', lambda x: x[0].strip())
@@ -1239,12 +1056,11 @@ class Worker(Thread): # Get details
     ## Utils
     def _convert_category_to_calibre_tags(self, genre_tags, filter_check=False):
         # for each tag, add if we have a dictionary lookup
-        calibre_tag_lookup = get_pref(PluginPrefsName.KEY_CATEGORY_MAPPINGS)
-        calibre_tag_map = dict((k.lower(),v) for (k,v) in calibre_tag_lookup.items())
+        calibre_tag_map = self.prefs.mapping(PluginPrefsName.KEY_CATEGORY_MAPPINGS)
         tags_to_add = list()
         for genre_tag in genre_tags:
-            if genre_tag.lower() in calibre_tag_map:
-                tags = calibre_tag_map.get(genre_tag.lower(), None)
+            if genre_tag.casefold() in calibre_tag_map:
+                tags = calibre_tag_map.get(genre_tag.casefold(), None)
                 if tags:
                     for tag in tags:
                         if tag not in tags_to_add:
@@ -1258,11 +1074,9 @@ class Worker(Thread): # Get details
             
         return list(tags_to_add)
 
-    def	_convert_to_calibre(self, remap_item, prefs, filter_check=False):
-        # for each tag, add if we have a dictionary lookup
-        calibre_map = dict((k.lower(),v) for (k,v) in prefs.items())
-        self.log.info('calibre_map: %s'%calibre_map)
-        calibre_remap_item = calibre_map.get(remap_item.lower(), None)
+    def	_convert_to_calibre(self, remap_item, calibre_map, filter_check=False):
+        # calibre_map - compiled lookup table with casefolded keys (see PrefsSnapshot.mapping)
+        calibre_remap_item = calibre_map.get(remap_item.casefold(), None)
         if calibre_remap_item:
             return calibre_remap_item[0]
         elif filter_check: